@@ -1,8 +1,12 @@
 # SPDX-License-Identifier: GPL-2.0
 # Copyright (C) 2020-present Team LibreELEC
 
+import copy
+import threading
+
 import dbus_utils
 import dbussy
+import log
 import ravel
 
 BUS_NAME = 'org.bluez'
@@ -107,32 +111,140 @@ class Agent(dbus_utils.Agent):
         raise dbussy.DBusError(ERROR_REJECTED, message)
 
 class Listener(object):
+    """Handlers of the BlueZ object signals, called by OBJECTS once it is updated"""
+
+    def __init__(self):
+        OBJECTS.add_listener(self)
+
+
+class ObjectCache(object):
+    """
+    Mirror of the objects of BlueZ, as returned by GetManagedObjects
+
+    It is read once on first use and then kept up to date from the
+    InterfacesAdded, InterfacesRemoved and PropertiesChanged signals of the
+    objects below /org/bluez. It is read again after bluetoothd gets a new
+    owner on the bus. Listeners are called with the signals once the
+    mirror is updated.
+    """
 
     def __init__(self):
-        dbus_utils.BUS.listen_objects_added(func=self._on_interfaces_added)
-        dbus_utils.BUS.listen_objects_removed(func=self._on_interfaces_removed)
+        self.lock = threading.Lock()
+        self.objects = None
+        self.generation = 0
+        self.listeners = []
+
+    def watch(self):
+        dbus_utils.BUS.listen_objects_added(func=self.on_interfaces_added)
+        dbus_utils.BUS.listen_objects_removed(func=self.on_interfaces_removed)
         dbus_utils.BUS.listen_propchanged(
             interface=dbussy.DBUS.INTERFACE_PROPERTIES,
             fallback=True,
-            func=self._on_properties_changed,
-            path='/')
+            func=self.on_properties_changed,
+            path=PATH_BLUEZ)
+        dbus_utils.NAMES.add_callback(self.on_name_owner_changed, BUS_NAME)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners.remove(listener)
+
+    def notify(self, handler, *args):
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                getattr(listener, handler)(*args)
+            except Exception as e:
+                log.log(f'{handler} of {type(listener).__name__} failed: {repr(e)}', log.ERROR)
+
+    def load(self):
+        with self.lock:
+            if self.objects is not None:
+                return
+        dbus_utils.read_consistent(self, lambda: get_managed_objects() if system_has_bluez() else {}, self.store)
+
+    def store(self, objects):
+        # the lock must be held
+        self.objects = {path: interfaces for path, interfaces in objects.items() if path.startswith(PATH_BLUEZ)}
+
+    def get_objects(self, interface):
+        """{path: properties} of the objects that implement interface"""
+        self.load()
+        with self.lock:
+            objects = self.objects or {}
+            return {path: copy.deepcopy(interfaces[interface]) for path, interfaces in objects.items() if interface in interfaces}
+
+    def get_properties(self, path, interface):
+        self.load()
+        with self.lock:
+            properties = (self.objects or {}).get(path, {}).get(interface)
+            return copy.deepcopy(properties) if properties is not None else None
+
+    def add_interfaces(self, path, interfaces):
+        if not path.startswith(PATH_BLUEZ):
+            return
+        with self.lock:
+            self.generation += 1
+            if self.objects is not None:
+                self.objects.setdefault(path, {}).update(copy.deepcopy(interfaces))
+
+    def remove_interfaces(self, path, interfaces):
+        if not path.startswith(PATH_BLUEZ):
+            return
+        with self.lock:
+            self.generation += 1
+            if self.objects is not None and path in self.objects:
+                for interface in interfaces:
+                    self.objects[path].pop(interface, None)
+                if not self.objects[path]:
+                    del self.objects[path]
+
+    def change_properties(self, path, interface, changed, invalidated):
+        with self.lock:
+            self.generation += 1
+            if self.objects is None:
+                return
+            properties = self.objects.get(path, {}).get(interface)
+            if properties is not None:
+                properties.update(copy.deepcopy(changed))
+                for name in invalidated:
+                    properties.pop(name, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.objects = None
+
+    # listeners are notified after the update, so they read the new state
 
     @ravel.signal(name='InterfacesAdded', in_signature='oa{sa{sv}}', arg_keys=('path', 'interfaces'))
-    def _on_interfaces_added(self, path, interfaces):
+    def on_interfaces_added(self, path, interfaces):
         interfaces = dbus_utils.convert_from_dbussy(interfaces)
-        self.on_interfaces_added(path, interfaces)
+        self.add_interfaces(path, interfaces)
+        self.notify('on_interfaces_added', path, interfaces)
 
     @ravel.signal(name='InterfacesRemoved', in_signature='oas', arg_keys=('path', 'interfaces'))
-    def _on_interfaces_removed(self, path, interfaces):
+    def on_interfaces_removed(self, path, interfaces):
         interfaces = dbus_utils.convert_from_dbussy(interfaces)
-        self.on_interfaces_removed(path, interfaces)
+        self.remove_interfaces(path, interfaces)
+        self.notify('on_interfaces_removed', path, interfaces)
 
     @ravel.signal(name='PropertiesChanged', in_signature='sa{sv}as', arg_keys=('interface', 'changed', 'invalidated'), path_keyword='path')
-    def _on_properties_changed(self, interface, changed, invalidated, path):
+    def on_properties_changed(self, interface, changed, invalidated, path):
         interface = dbus_utils.convert_from_dbussy(interface)
         changed = dbus_utils.convert_from_dbussy(changed)
         invalidated = dbus_utils.convert_from_dbussy(invalidated)
-        self.on_properties_changed(interface, changed, invalidated, path)
+        self.change_properties(path, interface, changed, invalidated)
+        self.notify('on_properties_changed', interface, changed, invalidated, path)
+
+    def on_name_owner_changed(self, name, old_owner, new_owner):
+        log.log(f'BlueZ owner changed to {new_owner!r}, dropping the object cache', log.INFO)
+        self.clear()
+
 
 def get_managed_objects():
     return dbus_utils.call_method(BUS_NAME, '/', dbussy.DBUSX.INTERFACE_OBJECT_MANAGER, 'GetManagedObjects')
@@ -200,20 +312,95 @@ def device_set_trusted(path, trusted):
 
 def find_adapter():
     if system_has_bluez():
-        objects = get_managed_objects()
-        for path, interfaces in objects.items():
-            if interfaces.get(INTERFACE_ADAPTER):
-                return path
+        for path in sorted(OBJECTS.get_objects(INTERFACE_ADAPTER)):
+            return path
 
 
 def find_devices():
-    devices = {}
-    objects = get_managed_objects()
-    for path, interfaces in objects.items():
-        if interfaces.get(INTERFACE_DEVICE):
-            devices[path] = interfaces[INTERFACE_DEVICE]
-    return devices
+    return OBJECTS.get_objects(INTERFACE_DEVICE)
+
+
+def is_adapter_powered(path):
+    properties = OBJECTS.get_properties(path, INTERFACE_ADAPTER)
+    if properties is None or 'Powered' not in properties:
+        return adapter_get_powered(path)
+    return properties['Powered']
+
+
+def is_device_connected(path):
+    properties = OBJECTS.get_properties(path, INTERFACE_DEVICE)
+    if properties is None or 'Connected' not in properties:
+        return device_get_connected(path)
+    return properties['Connected']
 
 
 def system_has_bluez():
-    return BUS_NAME in dbus_utils.list_names()
+    return dbus_utils.has_name(BUS_NAME)
+
+
+async def get_managed_objects_async():
+    return await dbus_utils.call_async_method(BUS_NAME, '/', dbussy.DBUSX.INTERFACE_OBJECT_MANAGER, 'GetManagedObjects')
+
+
+async def adapter_get_property_async(path, name):
+    return await dbus_utils.call_async_method(BUS_NAME, path, dbussy.DBUS.INTERFACE_PROPERTIES, 'Get', INTERFACE_ADAPTER, name)
+
+
+async def adapter_get_powered_async(path):
+    return await adapter_get_property_async(path, 'Powered')
+
+
+async def adapter_remove_device_async(path, device):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_ADAPTER, 'RemoveDevice', device)
+
+
+async def adapter_set_property_async(path, name, value):
+    return await dbus_utils.call_async_method(BUS_NAME, path, dbussy.DBUS.INTERFACE_PROPERTIES, 'Set', INTERFACE_ADAPTER, name, value)
+
+
+async def adapter_set_alias_async(path, alias):
+    return await adapter_set_property_async(path, 'Alias', (dbussy.DBUS.Signature('s'), alias))
+
+
+async def adapter_set_powered_async(path, powered):
+    return await adapter_set_property_async(path, 'Powered', (dbussy.DBUS.Signature('b'), powered))
+
+
+async def adapter_start_discovery_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_ADAPTER, 'StartDiscovery')
+
+
+async def adapter_stop_discovery_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_ADAPTER, 'StopDiscovery')
+
+
+async def device_get_property_async(path, name):
+    return await dbus_utils.call_async_method(BUS_NAME, path, dbussy.DBUS.INTERFACE_PROPERTIES, 'Get', INTERFACE_DEVICE, name)
+
+
+async def device_get_connected_async(path):
+    return await device_get_property_async(path, 'Connected')
+
+
+async def device_connect_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_DEVICE, 'Connect')
+
+
+async def device_disconnect_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_DEVICE, 'Disconnect')
+
+
+async def device_pair_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_DEVICE, 'Pair')
+
+
+async def device_set_property_async(path, name, value):
+    return await dbus_utils.call_async_method(BUS_NAME, path, dbussy.DBUS.INTERFACE_PROPERTIES, 'Set', INTERFACE_DEVICE, name, value)
+
+
+async def device_set_trusted_async(path, trusted):
+    return await device_set_property_async(path, 'Trusted', (dbussy.DBUS.Signature('b'), trusted))
+
+
+OBJECTS = ObjectCache()
+OBJECTS.watch()
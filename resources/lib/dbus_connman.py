@@ -1,6 +1,10 @@
 # SPDX-License-Identifier: GPL-2.0
 # Copyright (C) 2020-present Team LibreELEC
 
+import asyncio
+import copy
+import threading
+
 import dbus_utils
 import dbussy
 import log
@@ -85,48 +89,220 @@ class Agent(dbus_utils.Agent):
 
 
 class Listener(object):
+    """Handlers of the ConnMan signals, called by STATE once it is updated"""
 
     def __init__(self):
-        dbus_utils.BUS.listen_signal(
-            interface=INTERFACE_MANAGER,
-            fallback=True,
-            func=self._on_property_changed,
-            path='/',
-            name='PropertyChanged')
-        dbus_utils.BUS.listen_signal(
-            interface=INTERFACE_MANAGER,
-            fallback=True,
-            func=self._on_services_changed,
-            path='/',
-            name='ServicesChanged')
-        dbus_utils.BUS.listen_signal(
-            interface=INTERFACE_SERVICE,
-            fallback=True,
-            func=self._on_property_changed,
-            path='/',
-            name='PropertyChanged')
-        dbus_utils.BUS.listen_signal(
-            interface=INTERFACE_TECHNOLOGY,
-            fallback=True,
-            func=self._on_technology_changed,
-            path='/',
-            name='PropertyChanged')
+        STATE.add_listener(self)
+
+
+class State(object):
+    """
+    Mirror of the ConnMan services, technologies and clock properties
+
+    It is read once on first use and then kept up to date from the signals
+    of ConnMan. It is read again when connmand gets a new owner on the bus,
+    or on next use if that read fails.
+    Readers get copies, so reading causes no D-Bus traffic. Listeners are
+    called with the signals once the state is updated.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.services = None
+        self.technologies = None
+        self.clock = None
+        self.generation = 0
+        self.listeners = []
+
+    def watch(self):
+        for interface, func, name in (
+                (INTERFACE_MANAGER, self.on_manager_changed, 'PropertyChanged'),
+                (INTERFACE_MANAGER, self.on_services_changed, 'ServicesChanged'),
+                (INTERFACE_MANAGER, self.on_technology_added, 'TechnologyAdded'),
+                (INTERFACE_MANAGER, self.on_technology_removed, 'TechnologyRemoved'),
+                (INTERFACE_SERVICE, self.on_service_changed, 'PropertyChanged'),
+                (INTERFACE_TECHNOLOGY, self.on_technology_changed, 'PropertyChanged'),
+                (INTERFACE_CLOCK, self.on_clock_changed, 'PropertyChanged'),
+                ):
+            dbus_utils.BUS.listen_signal(
+                interface=interface,
+                fallback=True,
+                func=func,
+                path='/',
+                name=name)
+        dbus_utils.NAMES.add_callback(self.on_name_owner_changed, BUS_NAME)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners.remove(listener)
+
+    async def notify(self, handler, *args):
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                result = getattr(listener, handler)(*args)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                log.log(f'{handler} of {type(listener).__name__} failed: {repr(e)}', log.ERROR)
+
+    def load(self):
+        with self.lock:
+            if self.services is not None:
+                return
+        dbus_utils.read_consistent(self, self.read, self.store)
+
+    async def reload(self):
+        try:
+            await dbus_utils.read_consistent_async(
+                self,
+                lambda: asyncio.gather(manager_get_services_async(), manager_get_technologies_async(), clock_get_properties_async()),
+                self.store)
+        except Exception as e:
+            # the state stays unknown, load reads it again on next use
+            log.log(f'Failed to read the ConnMan state: {repr(e)}', log.ERROR)
+
+    def read(self):
+        if not dbus_utils.has_name(BUS_NAME):
+            return [], [], {}
+        return manager_get_services(), manager_get_technologies(), clock_get_properties()
+
+    def store(self, state):
+        # the lock must be held
+        services, technologies, clock = state
+        self.services = {path: properties for path, properties in services}
+        self.technologies = {path: properties for path, properties in technologies}
+        self.clock = clock
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.services = None
+            self.technologies = None
+            self.clock = None
+
+    def get_services(self):
+        self.load()
+        with self.lock:
+            services = self.services or {}
+            return [[path, copy.deepcopy(properties)] for path, properties in services.items()]
+
+    def get_service(self, path):
+        self.load()
+        with self.lock:
+            properties = (self.services or {}).get(path)
+            return copy.deepcopy(properties) if properties is not None else None
+
+    def get_technologies(self):
+        self.load()
+        with self.lock:
+            technologies = self.technologies or {}
+            return [[path, copy.deepcopy(properties)] for path, properties in technologies.items()]
+
+    def get_clock(self):
+        self.load()
+        with self.lock:
+            return copy.deepcopy(self.clock or {})
+
+    def update_services(self, services, removed):
+        with self.lock:
+            self.generation += 1
+            if self.services is None:
+                return
+            updated = {}
+            for path, properties in services:
+                updated[path] = dict(self.services.get(path, {}), **properties)
+            for path, properties in self.services.items():
+                updated.setdefault(path, properties)
+            for path in removed:
+                updated.pop(path, None)
+            self.services = updated
+
+    def update_service(self, path, name, value):
+        with self.lock:
+            self.generation += 1
+            if self.services is not None and path in self.services:
+                self.services[path][name] = value
+
+    def update_technology(self, path, name, value):
+        with self.lock:
+            self.generation += 1
+            if self.technologies is not None and path in self.technologies:
+                self.technologies[path][name] = value
+
+    # listeners are notified after the update, so they read the new state
 
     @ravel.signal(name='PropertyChanged', in_signature='sv', arg_keys=('name', 'value'), path_keyword='path')
-    async def _on_property_changed(self, name, value, path):
-        value = dbus_utils.convert_from_dbussy(value)
-        await self.on_property_changed(name, value, path)
+    async def on_manager_changed(self, name, value, path):
+        await self.notify('on_property_changed', name, dbus_utils.convert_from_dbussy(value), path)
 
     @ravel.signal(name='ServicesChanged', in_signature='a(oa{sv})ao', arg_keys=('services', 'removed'))
-    async def _on_services_changed(self, services, removed):
+    async def on_services_changed(self, services, removed):
         services = dbus_utils.convert_from_dbussy(services)
         removed = dbus_utils.convert_from_dbussy(removed)
-        await self.on_services_changed(services, removed)
+        self.update_services(services, removed)
+        await self.notify('on_services_changed', services, removed)
+
+    @ravel.signal(name='PropertyChanged', in_signature='sv', arg_keys=('name', 'value'), path_keyword='path')
+    async def on_service_changed(self, name, value, path):
+        value = dbus_utils.convert_from_dbussy(value)
+        self.update_service(path, name, value)
+        await self.notify('on_property_changed', name, value, path)
+
+    @ravel.signal(name='TechnologyAdded', in_signature='oa{sv}', arg_keys=('path', 'properties'))
+    async def on_technology_added(self, path, properties):
+        with self.lock:
+            self.generation += 1
+            if self.technologies is not None:
+                self.technologies[path] = dbus_utils.convert_from_dbussy(properties)
+
+    @ravel.signal(name='TechnologyRemoved', in_signature='o', arg_keys=('path',))
+    async def on_technology_removed(self, path):
+        with self.lock:
+            self.generation += 1
+            if self.technologies is not None:
+                self.technologies.pop(path, None)
 
     @ravel.signal(name='PropertyChanged', in_signature='sv', arg_keys=('name', 'value'), path_keyword='path')
-    async def _on_technology_changed(self, name, value, path):
+    async def on_technology_changed(self, name, value, path):
         value = dbus_utils.convert_from_dbussy(value)
-        await self.on_technology_changed(name, value, path)
+        self.update_technology(path, name, value)
+        await self.notify('on_technology_changed', name, value, path)
+
+    @ravel.signal(name='PropertyChanged', in_signature='sv', arg_keys=('name', 'value'))
+    async def on_clock_changed(self, name, value):
+        with self.lock:
+            self.generation += 1
+            if self.clock is not None:
+                self.clock[name] = dbus_utils.convert_from_dbussy(value)
+
+    async def on_name_owner_changed(self, name, old_owner, new_owner):
+        self.clear()
+        if new_owner != '':
+            log.log('ConnMan restarted, reading its state again', log.INFO)
+            await self.reload()
+
+
+def get_clock_properties():
+    return STATE.get_clock()
+
+
+def get_service_properties(path):
+    properties = STATE.get_service(path)
+    return properties if properties is not None else service_get_properties(path)
+
+
+def get_services():
+    return STATE.get_services()
+
+
+def get_technologies():
+    return STATE.get_technologies()
 
 
 def clock_get_properties():
@@ -175,11 +351,11 @@ def service_set_domains_configuration(path, domains):
 
 
 def service_set_ipv4_configuration(path, ipv4):
-    return service_set_property(path, 'IPv4.Configuration', (dbussy.DBUS.Signature('a{sv}'), {key: (dbussy.DBUS.Signature('s'), value) for key, value in ipv4.items()}))
+    return service_set_property(path, 'IPv4.Configuration', ipv4_configuration(ipv4))
 
 
 def service_set_ipv6_configuration(path, ipv6):
-    return service_set_property(path, 'IPv6.Configuration', (dbussy.DBUS.Signature('a{sv}'), {key: (dbussy.DBUS.Signature('y'), int(value)) if key == 'PrefixLength' else (dbussy.DBUS.Signature('s'), value) for key, value in ipv6.items()}))
+    return service_set_property(path, 'IPv6.Configuration', ipv6_configuration(ipv6))
 
 
 def service_set_nameservers_configuration(path, nameservers):
@@ -216,3 +392,104 @@ def technology_wifi_set_tethering_identifier(identifier):
 
 def technology_wifi_set_tethering_passphrase(passphrase):
     return technology_set_property(PATH_TECH_WIFI, 'TetheringPassphrase', (dbussy.DBUS.Signature('s'), passphrase))
+
+
+def ipv4_configuration(ipv4):
+    return (dbussy.DBUS.Signature('a{sv}'), {key: (dbussy.DBUS.Signature('s'), value) for key, value in ipv4.items()})
+
+
+def ipv6_configuration(ipv6):
+    return (dbussy.DBUS.Signature('a{sv}'), {key: (dbussy.DBUS.Signature('y'), int(value)) if key == 'PrefixLength' else (dbussy.DBUS.Signature('s'), value) for key, value in ipv6.items()})
+
+
+async def clock_get_properties_async():
+    return await dbus_utils.call_async_method(BUS_NAME, '/', INTERFACE_CLOCK, 'GetProperties')
+
+
+async def clock_set_timeservers_async(timeservers):
+    return await dbus_utils.call_async_method(BUS_NAME, '/', INTERFACE_CLOCK, 'SetProperty', 'Timeservers', (dbussy.DBUS.Signature('as'), timeservers))
+
+
+async def manager_get_properties_async():
+    return await dbus_utils.call_async_method(BUS_NAME, '/', INTERFACE_MANAGER, 'GetProperties')
+
+
+async def manager_get_services_async():
+    return await dbus_utils.call_async_method(BUS_NAME, '/', INTERFACE_MANAGER, 'GetServices')
+
+
+async def manager_get_technologies_async():
+    return await dbus_utils.call_async_method(BUS_NAME, '/', INTERFACE_MANAGER, 'GetTechnologies')
+
+
+async def service_connect_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_SERVICE, 'Connect')
+
+
+async def service_disconnect_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_SERVICE, 'Disconnect')
+
+
+async def service_get_properties_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_SERVICE, 'GetProperties')
+
+
+async def service_remove_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_SERVICE, 'Remove')
+
+
+async def service_set_autoconnect_async(path, autoconnect):
+    autoconnect = True if autoconnect == True else False
+    return await service_set_property_async(path, 'AutoConnect', (dbussy.DBUS.Signature('b'), autoconnect))
+
+
+async def service_set_domains_configuration_async(path, domains):
+    return await service_set_property_async(path, 'Domains.Configuration', (dbussy.DBUS.Signature('as'), domains))
+
+
+async def service_set_ipv4_configuration_async(path, ipv4):
+    return await service_set_property_async(path, 'IPv4.Configuration', ipv4_configuration(ipv4))
+
+
+async def service_set_ipv6_configuration_async(path, ipv6):
+    return await service_set_property_async(path, 'IPv6.Configuration', ipv6_configuration(ipv6))
+
+
+async def service_set_nameservers_configuration_async(path, nameservers):
+    return await service_set_property_async(path, 'Nameservers.Configuration', (dbussy.DBUS.Signature('as'), nameservers))
+
+
+async def service_set_property_async(path, name, value):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_SERVICE, 'SetProperty', name, value)
+
+
+async def service_set_timeservers_configuration_async(path, timeservers):
+    return await service_set_property_async(path, 'Timeservers.Configuration', (dbussy.DBUS.Signature('as'), timeservers))
+
+
+async def technology_set_powered_async(path, state):
+    return await technology_set_property_async(path, 'Powered', (dbussy.DBUS.Signature('b'), state))
+
+
+async def technology_set_property_async(path, name, value):
+    return await dbus_utils.call_async_method(BUS_NAME, path, INTERFACE_TECHNOLOGY, 'SetProperty', name, value)
+
+
+async def technology_wifi_scan_async():
+    return await dbus_utils.call_async_method(BUS_NAME, PATH_TECH_WIFI, INTERFACE_TECHNOLOGY, 'Scan')
+
+
+async def technology_wifi_set_tethering_async(state):
+    return await technology_set_property_async(PATH_TECH_WIFI, 'Tethering', (dbussy.DBUS.Signature('b'), state))
+
+
+async def technology_wifi_set_tethering_identifier_async(identifier):
+    return await technology_set_property_async(PATH_TECH_WIFI, 'TetheringIdentifier', (dbussy.DBUS.Signature('s'), identifier))
+
+
+async def technology_wifi_set_tethering_passphrase_async(passphrase):
+    return await technology_set_property_async(PATH_TECH_WIFI, 'TetheringPassphrase', (dbussy.DBUS.Signature('s'), passphrase))
+
+
+STATE = State()
+STATE.watch()
@@ -67,3 +67,7 @@ class Listener(object):
 
 def transfer_get_all_properties(path):
     return dbus_utils.call_method(BUS_NAME, path, dbussy.DBUS.INTERFACE_PROPERTIES, 'GetAll', INTERFACE_TRANSFER)
+
+
+async def transfer_get_all_properties_async(path):
+    return await dbus_utils.call_async_method(BUS_NAME, path, dbussy.DBUS.INTERFACE_PROPERTIES, 'GetAll', INTERFACE_TRANSFER)
@@ -0,0 +1,110 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import asyncio
+
+import dbus_utils
+import log
+import ravel
+
+BUS_NAME = 'org.freedesktop.systemd1'
+INTERFACE_MANAGER = 'org.freedesktop.systemd1.Manager'
+MODE_REPLACE = 'replace'
+PATH_MANAGER = '/org/freedesktop/systemd1'
+TIMEOUT = 90
+
+
+class JobWatcher(object):
+    """
+    Results of systemd jobs, reported by the JobRemoved signal
+
+    A job can finish before the call that queued it returns its path, so
+    results that arrive while calls are in flight are kept until claimed.
+    Must be used from the event loop of dbus_utils.
+    """
+
+    def __init__(self):
+        self.futures = {}
+        self.finished = {}
+        self.calls = 0
+        self.subscribed = False
+
+    async def subscribe(self):
+        if self.subscribed:
+            return
+        dbus_utils.BUS.listen_signal(
+            interface=INTERFACE_MANAGER,
+            fallback=True,
+            func=self.on_job_removed,
+            path=PATH_MANAGER,
+            name='JobRemoved')
+        await dbus_utils.call_async_method(BUS_NAME, PATH_MANAGER, INTERFACE_MANAGER, 'Subscribe')
+        self.subscribed = True
+
+    @ravel.signal(name='JobRemoved', in_signature='uoss', arg_keys=('id', 'job', 'unit', 'result'))
+    async def on_job_removed(self, id, job, unit, result):
+        future = self.futures.pop(job, None)
+        if future is not None:
+            if not future.done():
+                future.set_result(result)
+        elif self.calls > 0:
+            self.finished[job] = result
+
+    async def run_job(self, method, unit, mode, timeout):
+        self.calls += 1
+        try:
+            job = await dbus_utils.call_async_method(BUS_NAME, PATH_MANAGER, INTERFACE_MANAGER, method, unit, mode)
+        except Exception as e:
+            return getattr(e, 'name', repr(e))
+        finally:
+            self.calls -= 1
+            if self.calls == 0:
+                finished, self.finished = self.finished, {}
+            else:
+                finished = self.finished
+        if job in finished:
+            return finished.pop(job)
+        future = asyncio.get_running_loop().create_future()
+        self.futures[job] = future
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return 'timeout'
+        finally:
+            self.futures.pop(job, None)
+
+
+WATCHER = JobWatcher()
+
+
+async def manage_units(method, units, mode=MODE_REPLACE, timeout=TIMEOUT):
+    """
+    Queue a job for every unit at once and wait for all of them
+
+    Returns {unit: result}, result is the one of JobRemoved ('done',
+    'failed', 'canceled', 'timeout', 'dependency' or 'skipped') or the
+    name of the D-Bus error if the job could not be queued.
+    """
+    units = list(units)
+    await WATCHER.subscribe()
+    results = await asyncio.gather(*[WATCHER.run_job(method, unit, mode, timeout) for unit in units])
+    for unit, result in zip(units, results):
+        if result != 'done':
+            log.log(f'{method} {unit}: {result}', log.WARNING)
+    return dict(zip(units, results))
+
+
+def run_units(method, units, mode=MODE_REPLACE, timeout=TIMEOUT):
+    return dbus_utils.submit(manage_units(method, units, mode, timeout)).result()
+
+
+def manager_restart_units(units, mode=MODE_REPLACE):
+    return run_units('RestartUnit', units, mode)
+
+
+def manager_start_units(units, mode=MODE_REPLACE):
+    return run_units('StartUnit', units, mode)
+
+
+def manager_stop_units(units, mode=MODE_REPLACE):
+    return run_units('StopUnit', units, mode)
@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: GPL-2.0
 # Copyright (C) 2020-present Team LibreELEC
 import asyncio
+import collections
 import dbussy
 import log
 import ravel
@@ -8,7 +9,18 @@ import threading
 
 BUS_NAME = ''
 INTERFACE_AGENT = ''
+INTERFACE_OBJECT_MANAGER = 'org.freedesktop.DBus.ObjectManager'
 PATH_AGENT = ''
+PROXY_CACHE_SIZE = 64
+# full reads of a cache that signals race with before the last one is kept
+READ_ATTEMPTS = 3
+# errors after which a cached proxy is not trusted anymore
+STALE_PROXY_ERRORS = {
+    'org.freedesktop.DBus.Error.ServiceUnknown',
+    'org.freedesktop.DBus.Error.UnknownInterface',
+    'org.freedesktop.DBus.Error.UnknownMethod',
+    'org.freedesktop.DBus.Error.UnknownObject',
+    }
 
 
 class Agent(object):
@@ -16,22 +28,16 @@ class Agent(object):
     def __init__(self, bus_name, path_agent):
         self.bus_name = bus_name
         self.path_agent = path_agent
-        if self.bus_name in list_names():
+        if has_name(self.bus_name):
             self.register_agent()
         self.watch_name()
 
     @log.log_function()
     def watch_name(self):
-        BUS.listen_signal(
-            interface=dbussy.DBUS.SERVICE_DBUS,
-            fallback=True,
-            func=self.on_name_owner_changed,
-            path='/',
-            name='NameOwnerChanged')
+        NAMES.add_callback(self.on_name_owner_changed, self.bus_name)
 
-    @ravel.signal(name='NameOwnerChanged', in_signature='sss', arg_keys=('name', 'old_owner', 'new_owner'))
-    async def on_name_owner_changed(self, name, old_owner, new_owner):
-        if name == self.bus_name and new_owner != '':
+    def on_name_owner_changed(self, name, old_owner, new_owner):
+        if new_owner != '':
             self.register_agent()
 
     @log.log_function()
@@ -63,6 +69,122 @@ class Bool(int):
         return '1' if self == True else '0'
 
 
+class NameRegistry(object):
+    """
+    Names on the bus, read once with ListNames and then kept current from
+    NameOwnerChanged
+
+    Callbacks are called on the event loop with (name, old_owner,
+    new_owner) after the registry has been updated, they may be coroutine
+    functions.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.names = None
+        self.generation = 0
+        self.callbacks = []
+
+    def watch(self):
+        BUS.listen_signal(
+            interface=dbussy.DBUS.SERVICE_DBUS,
+            fallback=True,
+            func=self.on_name_owner_changed,
+            path='/',
+            name='NameOwnerChanged')
+
+    def load(self):
+        with self.lock:
+            if self.names is not None:
+                return
+        read_consistent(self, list_names, self.store)
+
+    def store(self, names):
+        # the lock must be held
+        self.names = set(names)
+
+    def has_name(self, name):
+        self.load()
+        with self.lock:
+            return name in self.names
+
+    def add_callback(self, callback, name=None):
+        """Call callback when the owner of name changes, or of any name if None"""
+        with self.lock:
+            self.callbacks.append((name, callback))
+
+    def remove_callback(self, callback, name=None):
+        with self.lock:
+            self.callbacks.remove((name, callback))
+
+    @ravel.signal(name='NameOwnerChanged', in_signature='sss', arg_keys=('name', 'old_owner', 'new_owner'))
+    async def on_name_owner_changed(self, name, old_owner, new_owner):
+        with self.lock:
+            self.generation += 1
+            if self.names is not None:
+                if new_owner != '':
+                    self.names.add(name)
+                else:
+                    self.names.discard(name)
+            callbacks = [callback for watched, callback in self.callbacks if watched in (None, name)]
+        for callback in callbacks:
+            try:
+                result = callback(name, old_owner, new_owner)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                log.log(f'Callback for {name} failed: {repr(e)}', log.ERROR)
+
+
+class ProxyCache(object):
+    """
+    Interface proxies by (bus name, path, interface), least recently used first
+
+    Building a proxy introspects the object, so proxies are kept until
+    the owner of the bus name changes or the interface is removed.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.proxies = collections.OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            proxy = self.proxies.get(key)
+            if proxy is not None:
+                self.proxies.move_to_end(key)
+            return proxy
+
+    def put(self, key, proxy):
+        with self.lock:
+            self.proxies[key] = proxy
+            self.proxies.move_to_end(key)
+            while len(self.proxies) > self.size:
+                self.proxies.popitem(last=False)
+
+    def discard(self, match):
+        with self.lock:
+            for key in [key for key in self.proxies if match(key)]:
+                del self.proxies[key]
+
+    def watch(self):
+        NAMES.add_callback(self.on_name_owner_changed)
+        BUS.listen_signal(
+            interface=INTERFACE_OBJECT_MANAGER,
+            fallback=True,
+            func=self.on_interfaces_removed,
+            path='/',
+            name='InterfacesRemoved')
+
+    def on_name_owner_changed(self, name, old_owner, new_owner):
+        self.discard(lambda key: key[1] in (name, old_owner))
+
+    @ravel.signal(name='InterfacesRemoved', in_signature='oas', arg_keys=('path', 'interfaces'))
+    async def on_interfaces_removed(self, path, interfaces):
+        self.discard(lambda key: key[2] == path and key[3] in interfaces)
+
+
 class LoopThread(threading.Thread):
 
     def __init__(self, loop):
@@ -90,6 +212,10 @@ def list_names():
     return BUS[dbussy.DBUS.SERVICE_DBUS]['/'].get_interface(dbussy.DBUS.INTERFACE_DBUS).ListNames()[0]
 
 
+def has_name(name):
+    return NAMES.has_name(name)
+
+
 def convert_from_dbussy(data):
     if isinstance(data, bool):
         return Bool(data)
@@ -102,29 +228,109 @@ def convert_from_dbussy(data):
     return data
 
 
+def get_interface(bus_name, path, interface):
+    key = (False, bus_name, path, interface)
+    proxy = PROXIES.get(key)
+    if proxy is None:
+        proxy = BUS[bus_name][path].get_interface(interface)
+        PROXIES.put(key, proxy)
+    return proxy
+
+
+async def get_async_interface(bus_name, path, interface):
+    key = (True, bus_name, path, interface)
+    proxy = PROXIES.get(key)
+    if proxy is None:
+        proxy = await BUS[bus_name][path].get_async_interface(interface)
+        PROXIES.put(key, proxy)
+    return proxy
+
+
 def call_method(bus_name, path, interface, method_name, *args, **kwargs):
-    interface = BUS[bus_name][path].get_interface(interface)
-    method = getattr(interface, method_name)
-    result = method(*args, **kwargs)
+    proxy = get_interface(bus_name, path, interface)
+    method = getattr(proxy, method_name)
+    try:
+        result = method(*args, **kwargs)
+    except dbussy.DBusError as e:
+        if e.name in STALE_PROXY_ERRORS:
+            PROXIES.discard(lambda key: key[1:] == (bus_name, path, interface))
+        raise
     first = next(iter(result or []), None)
     return convert_from_dbussy(first)
 
 
 async def call_async_method(bus_name, path, interface, method_name, *args, **kwargs):
-    interface = await BUS[bus_name][path].get_async_interface(interface)
-    method = getattr(interface, method_name)
-    result = await method(*args, **kwargs)
+    proxy = await get_async_interface(bus_name, path, interface)
+    method = getattr(proxy, method_name)
+    try:
+        result = await method(*args, **kwargs)
+    except dbussy.DBusError as e:
+        if e.name in STALE_PROXY_ERRORS:
+            PROXIES.discard(lambda key: key[1:] == (bus_name, path, interface))
+        raise
     first = next(iter(result or []), None)
     return convert_from_dbussy(first)
 
 
 def run_method(bus_name, path, interface, method_name, *args, **kwargs):
-    future = asyncio.run_coroutine_threadsafe(call_async_method(
-        bus_name, path, interface, method_name, *args, **kwargs), LOOP)
+    future = submit(call_async_method(
+        bus_name, path, interface, method_name, *args, **kwargs))
     return future.result()
 
 
+# the *_async helpers of the dbus_* modules are coroutines for LOOP, other
+# threads run them with submit or gather
+
+def submit(coroutine):
+    """Run coroutine on LOOP, returns a concurrent.futures.Future that can be used from any thread"""
+    return asyncio.run_coroutine_threadsafe(coroutine, LOOP)
+
+
+def gather(*coroutines, return_exceptions=False):
+    """Run the coroutines concurrently on LOOP, the future returns their results in order"""
+    async def gather_coroutines():
+        return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+    return submit(gather_coroutines())
+
+
+def read_consistent(cache, read, store):
+    """
+    Store the result of read, repeated while signals change the cache
+
+    cache has a lock and a generation that its signal handlers increase.
+    store is called with the lock held. The last of READ_ATTEMPTS reads is
+    stored even if a signal arrived meanwhile, that change is then lost
+    until the cache is read again.
+    """
+    for attempt in range(READ_ATTEMPTS):
+        generation = cache.generation
+        if store_consistent(cache, generation, attempt, store, read()):
+            return
+
+
+async def read_consistent_async(cache, read, store):
+    """read_consistent for a read that returns an awaitable, on LOOP"""
+    for attempt in range(READ_ATTEMPTS):
+        generation = cache.generation
+        if store_consistent(cache, generation, attempt, store, await read()):
+            return
+
+
+def store_consistent(cache, generation, attempt, store, result):
+    with cache.lock:
+        if generation != cache.generation:
+            if attempt < READ_ATTEMPTS - 1:
+                return False
+            log.log(f'{type(cache).__name__} changed while being read, keeping the last read', log.WARNING)
+        store(result)
+        return True
+
+
 LOOP = asyncio.get_event_loop()
 BUS = ravel.system_bus()
 BUS.attach_asyncio(LOOP)
 LOOP_THREAD = LoopThread(LOOP)
+NAMES = NameRegistry()
+NAMES.watch()
+PROXIES = ProxyCache(PROXY_CACHE_SIZE)
+PROXIES.watch()
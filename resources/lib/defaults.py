@@ -13,6 +13,14 @@ XBMC_USER_HOME = os.environ.get('XBMC_USER_HOME', '/storage/.kodi')
 CONFIG_CACHE = os.environ.get('CONFIG_CACHE', '/storage/.cache')
 USER_CONFIG = os.environ.get('USER_CONFIG', '/storage/.config')
 
+# storage format of the addon settings, 'xml' (oe_settings.xml) or 'json'
+SETTINGS_BACKEND = os.environ.get('SETTINGS_BACKEND', 'xml')
+
+# create the main window in the background once Kodi has been idle for a while
+PREWARM_WINDOW = os.environ.get('PREWARM_WINDOW', 'yes') == 'yes'
+PREWARM_DELAY = 30
+PREWARM_IDLE = 10
+
 ################################################################################
 # Connamn Module
 ################################################################################
@@ -62,7 +70,7 @@ services = {
 system = {
     'ENABLED': True,
     'KERNEL_CMD': '/proc/cmdline',
-    'SET_CLOCK_CMD': '/sbin/hwclock --systohc --utc',
+    'SET_CLOCK_CMD': ['/sbin/hwclock', '--systohc', '--utc'],
     'XBMC_RESET_FILE': f'{CONFIG_CACHE}/reset_soft',
     'LIBREELEC_RESET_FILE': f'{CONFIG_CACHE}/reset_hard',
     'KEYBOARD_INFO': '/usr/share/X11/xkb/rules/base.xml',
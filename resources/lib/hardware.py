@@ -0,0 +1,162 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import collections
+import concurrent.futures
+import json
+import os
+import tempfile
+import types
+
+import log
+import process_tools
+
+TIMEOUT = 15
+
+BOOT_STATUS = '/storage/.config/boot.status'
+MACHINE_ID = '/etc/machine-id'
+
+Facts = collections.namedtuple('Facts', ['system_id', 'boot_status', 'rpi_cpu_ver', 'rpi_eeprom', 'hardware_flags'])
+
+# used for the probes that did not finish in time
+DEFAULTS = Facts(
+    system_id='',
+    boot_status='',
+    rpi_cpu_ver='',
+    rpi_eeprom=None,
+    hardware_flags='unknown',
+    )
+
+
+def read_file(path):
+    try:
+        with open(path, encoding='utf-8') as input:
+            return input.read().strip()
+    except OSError:
+        return ''
+
+
+def get_system_id():
+    if os.path.exists(MACHINE_ID):
+        return read_file(MACHINE_ID)
+    return os.environ.get('SYSTEMID', '')
+
+
+# Identify connected GPU card (card0, card1 etc.)
+def get_gpu_card():
+    for root, dirs, files in os.walk('/sys/class/drm', followlinks=False):
+        for dir in dirs:
+            try:
+                with open(os.path.join(root, dir, 'status'), 'r') as infile:
+                    for line in [x for x in infile if x.replace('\n', '') == 'connected']:
+                        return dir.split('-')[0]
+            except:
+                pass
+        break
+    return 'card0'
+
+
+# Driver of the first VGA controller listed by lspci -k
+def get_lspci_driver(lspci):
+    vga = lspci.find('VGA compatible controller')
+    if vga == -1:
+        return ''
+    for line in lspci[vga:].splitlines():
+        if 'Kernel driver in use' in line:
+            fields = line.split(' ')
+            return fields[4] if len(fields) > 4 else ''
+    return ''
+
+
+# Return driver name, eg. 'i915', 'i965', 'nvidia', 'nvidia-legacy', 'amdgpu', 'radeon', 'vmwgfx', 'virtio-pci' etc.
+def get_hardware_flags_x86_64(probes):
+    gpu_props = {}
+    gpu_driver = ''
+    gpu_card = get_gpu_card()
+    log.log(f'Using card: {gpu_card}', log.DEBUG)
+    gpu_path = probes.output(['/usr/bin/udevadm', 'info', f'--name=/dev/dri/{gpu_card}', '--query', 'path'], quiet=True).replace('\n', '')
+    log.log(f'gpu path: {gpu_path}', log.DEBUG)
+    if gpu_path:
+        drv_path = os.path.dirname(os.path.dirname(gpu_path))
+        props = probes.output(['/usr/bin/udevadm', 'info', f'--path={drv_path}', '--query=property'], quiet=True)
+        if props:
+            for key, value in [x.strip().split('=') for x in props.strip().split('\n')]:
+                gpu_props[key] = value
+        log.log(f'gpu props: {gpu_props}', log.DEBUG)
+        gpu_driver = gpu_props.get('DRIVER', '')
+    if not gpu_driver:
+        gpu_driver = get_lspci_driver(probes.output(['lspci', '-k']))
+    if gpu_driver == 'nvidia' and os.path.realpath('/var/lib/nvidia_drv.so').endswith('nvidia-legacy_drv.so'):
+        gpu_driver = 'nvidia-legacy'
+    log.log(f'gpu driver: {gpu_driver}', log.DEBUG)
+    return gpu_driver if gpu_driver else 'unknown'
+
+
+def get_hardware_flags_dtflag(probes):
+    if os.path.exists('/usr/bin/dtflag'):
+        dtflag = probes.output(['/usr/bin/dtflag']).rstrip('\x00\n')
+    else:
+        dtflag = 'unknown'
+    log.log(f'ARM board: {dtflag}', log.DEBUG)
+    return dtflag
+
+
+def get_hardware_flags(project, architecture, probes):
+    if project == 'Generic':
+        return get_hardware_flags_x86_64(probes)
+    elif architecture.split('.')[1] in ['aarch64', 'arm']:
+        return get_hardware_flags_dtflag(probes)
+    else:
+        log.log(f'Project is {project}, no hardware flag available', log.DEBUG)
+        return ''
+
+
+def get_rpi_cpu_ver(project, probes):
+    if project != 'RPi':
+        return ''
+    otp = probes.output(['vcgencmd', 'otp_dump'], quiet=True)
+    return next((line[7:8] for line in otp.splitlines() if '30:' in line), '')
+
+
+# JSON report of rpi-eeprom-update, None if the board is not supported
+def get_rpi_eeprom():
+    with tempfile.NamedTemporaryFile(mode='r', delete=True) as machine_out:
+        console_output = process_tools.output(['/usr/bin/.rpi-eeprom-update.real', '-j', '-m', machine_out.name])
+        log.log(f'console output: {console_output}', log.DEBUG)
+        if os.path.getsize(machine_out.name) == 0:
+            return None
+        return types.MappingProxyType(json.load(machine_out))
+
+
+def get_rpi_facts(project, probes):
+    rpi_cpu_ver = get_rpi_cpu_ver(project, probes)
+    return (rpi_cpu_ver, get_rpi_eeprom() if rpi_cpu_ver == '3' else None)
+
+
+def collect(project, architecture, probes, timeout=TIMEOUT):
+    """
+    Run all hardware probes concurrently and return their results as Facts
+
+    Probes that fail or do not finish within timeout seconds are logged and
+    reported with their value from DEFAULTS.
+    """
+    probe_functions = {
+        'system_id': get_system_id,
+        'boot_status': lambda: read_file(BOOT_STATUS),
+        'rpi': lambda: get_rpi_facts(project, probes),
+        'hardware_flags': lambda: get_hardware_flags(project, architecture, probes),
+        }
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(probe_functions), thread_name_prefix='hardware')
+    futures = {name: executor.submit(function) for name, function in probe_functions.items()}
+    concurrent.futures.wait(futures.values(), timeout=timeout)
+    executor.shutdown(wait=False)
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            log.log(f'Hardware probe {name} timed out after {timeout}s', log.WARNING)
+        elif future.exception() is not None:
+            log.log(f'Hardware probe {name} failed: {repr(future.exception())}', log.ERROR)
+        else:
+            results[name] = future.result()
+    rpi_cpu_ver, rpi_eeprom = results.pop('rpi', (DEFAULTS.rpi_cpu_ver, DEFAULTS.rpi_eeprom))
+    return DEFAULTS._replace(rpi_cpu_ver=rpi_cpu_ver, rpi_eeprom=rpi_eeprom, **results)
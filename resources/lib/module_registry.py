@@ -0,0 +1,140 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import ast
+import json
+import os
+import threading
+
+import log
+import settings
+
+# class attributes known before a module is imported
+DECLARED = ('menu', 'ENABLED', 'START_AFTER')
+# version of the declarations cache, older caches are read again
+CACHE_VERSION = 2
+
+
+def read_declaration(path, class_name):
+    """
+    Literal DECLARED attributes of class_name in path, read without importing it
+
+    'defines_start_service' tells whether the class defines start_service
+    itself, it is no class attribute and is not answered by ModuleProxy.
+    """
+    with open(path, 'r', encoding='utf-8') as source:
+        tree = ast.parse(source.read(), path)
+    declaration = {'defines_start_service': False}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef) or node.name != class_name:
+            continue
+        for item in node.body:
+            if isinstance(item, ast.Assign):
+                for target in item.targets:
+                    if isinstance(target, ast.Name) and target.id in DECLARED:
+                        try:
+                            declaration[target.id] = ast.literal_eval(item.value)
+                        except ValueError:
+                            pass
+            elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name == 'start_service':
+                declaration['defines_start_service'] = True
+    return declaration
+
+
+class Declarations(object):
+    """Declarations of the modules, cached in a JSON file until their source changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.cache = None
+        self.dirty = False
+
+    def load(self):
+        # the lock must be held
+        if self.cache is None:
+            try:
+                with open(self.path) as cache_file:
+                    cache = json.load(cache_file)
+                self.cache = cache['modules'] if cache.get('version') == CACHE_VERSION else {}
+            except (OSError, ValueError, KeyError, AttributeError):
+                self.cache = {}
+        return self.cache
+
+    def get(self, path, class_name):
+        """Declaration of class_name in path, None if it cannot be read"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        with self.lock:
+            cached = self.load().get(path)
+            if cached is not None and cached['stamp'] == stamp and cached['class'] == class_name:
+                return dict(cached['declaration'])
+        try:
+            declaration = read_declaration(path, class_name)
+        except (OSError, SyntaxError, ValueError) as e:
+            log.log(f'Failed to read the declaration of {class_name} in {path}: {repr(e)}', log.ERROR)
+            return None
+        with self.lock:
+            self.cache[path] = {'stamp': stamp, 'class': class_name, 'declaration': declaration}
+            self.dirty = True
+        return dict(declaration)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                settings.write_atomic(self.path, json.dumps({'version': CACHE_VERSION, 'modules': self.cache}))
+                self.dirty = False
+            except OSError as e:
+                log.log(f'Failed to write {self.path}: {repr(e)}', log.ERROR)
+
+
+class ModuleProxy(object):
+    """
+    Stand-in for a settings module that is created on first use
+
+    Until then the DECLARED attributes are answered from the declaration,
+    any other attribute access creates the module by calling factory and
+    is forwarded to it.
+    """
+
+    def __init__(self, name, declaration, factory):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_declaration', declaration)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_lock', threading.RLock())
+        object.__setattr__(self, '_instance', None)
+
+    def is_loaded(self):
+        return self._instance is not None
+
+    def load(self):
+        with self._lock:
+            if self._instance is None:
+                log.log(f'Loading module {self._name}', log.DEBUG)
+                object.__setattr__(self, '_instance', self._factory())
+            return self._instance
+
+    def __getattr__(self, name):
+        if self._instance is None and name in DECLARED and name in self._declaration:
+            return self._declaration[name]
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.load(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self._instance is not None else 'not loaded'
+        return f'<ModuleProxy {self._name} ({state})>'
+
+
+def is_loaded(module):
+    return not isinstance(module, ModuleProxy) or module.is_loaded()
@@ -6,6 +6,9 @@ import oe
 
 class Module(object):
 
+    # names of the modules whose start_service must finish first
+    START_AFTER = ()
+
     @log.log_function()
     def __init__(self):
         name = self.__class__.__name__
@@ -13,11 +13,13 @@ from dbussy import DBusError
 
 import dbus_bluez
 import dbus_obex
+import dbus_utils
 import hostname
 import log
 import modules
 import oe
 import oeWindows
+import timeline
 
 
 class bluetooth(modules.Module):
@@ -29,6 +31,7 @@ class bluetooth(modules.Module):
         'InfoText': 704,
         }}
     ENABLED = False
+    START_AFTER = ('services',)
     OBEX_ROOT = None
     OBEX_DAEMON = None
     BLUETOOTH_DAEMON = None
@@ -82,8 +85,9 @@ class bluetooth(modules.Module):
 
     @log.log_function()
     def start_service(self):
-        self.bluez_agent = Bluez_Agent(self)
-        self.obex_agent = Obex_Agent(self)
+        with timeline.TIMELINE.phase('bluetooth/agents'):
+            self.bluez_agent = Bluez_Agent(self)
+            self.obex_agent = Obex_Agent(self)
         self.bluez_listener = Bluez_Listener(self)
         self.obex_listener = Obex_Listener(self)
         self.find_adapter()
@@ -282,9 +286,7 @@ class bluetooth(modules.Module):
 
     @log.log_function()
     def discover_devices(self):
-        if not hasattr(oe, 'winOeMain'):
-            return
-        if not oe.winOeMain.visible:
+        if not oe.window_visible():
             return
         if not dbus_bluez.system_has_bluez():
             self.found_devices = frozenset()
@@ -302,7 +304,7 @@ class bluetooth(modules.Module):
             oe.dbg_log('bluetooth::menu_connections', 'exit_function (No Adapter)', oe.LOGDEBUG)
             oe.winOeMain.setProperty('show_bt_label', 'true')
             return
-        if not dbus_bluez.adapter_get_powered(self.dbusBluezAdapter):
+        if not dbus_bluez.is_adapter_powered(self.dbusBluezAdapter):
             self.found_devices = frozenset()
             oe.winOeMain.getControl(1301).setLabel(oe._(32338))
             oe.winOeMain.getControl(int(oe.listObject['btlist'])).reset()
@@ -450,9 +452,17 @@ class bluetooth(modules.Module):
         if self.dbusBluezAdapter:
             devices = oe.read_setting('bluetooth', 'standby')
             if devices:
-                for device in devices.split(','):
-                    if dbus_bluez.device_get_connected(device):
-                        self.disconnect_device_by_path(device)
+                connected = [device for device in devices.split(',') if dbus_bluez.is_device_connected(device)]
+                if not connected:
+                    return
+                results = dbus_utils.gather(*[dbus_bluez.device_disconnect_async(device) for device in connected],
+                                            return_exceptions=True).result()
+                for device, result in zip(connected, results):
+                    if isinstance(result, DBusError):
+                        self.dbus_error_handler(result)
+                    elif isinstance(result, Exception):
+                        log.log(f'Failed to disconnect {device}: {repr(result)}', log.ERROR)
+                self.menu_connections()
 
 
 ####################################################################
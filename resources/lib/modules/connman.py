@@ -15,6 +15,8 @@ import string
 import ui_tools
 import regdomain
 import dbus_connman
+import dbus_utils
+import timeline
 import log
 from dbussy import DBusError
 
@@ -267,7 +269,7 @@ class connmanService(object):
         self.winOeCon = oeWindows.mainWindow('service-LibreELEC-Settings-mainWindow.xml', oe.__cwd__, 'Default', oeMain=oe, isChild=True)
         self.servicePath = servicePath
         oe.dictModules['connmanNetworkConfig'] = self
-        self.service_properties = dbus_connman.service_get_properties(servicePath)
+        self.service_properties = dbus_connman.get_service_properties(servicePath)
         for entry in sorted(self.datamap):
             for (key, value) in self.datamap[entry].items():
                 if self.struct[value]['type'] == 'Boolean':
@@ -329,18 +331,23 @@ class connmanService(object):
             def get_dict(root):
                 return {key:root[key]['value'] for key in root.keys() if root[key]['value'] != ''}
 
-            dbus_connman.service_set_autoconnect(self.servicePath,
-                self.struct['AutoConnect']['settings']['AutoConnect']['value'])
-            dbus_connman.service_set_domains_configuration(self.servicePath,
-                get_array(self.struct['Domains']['settings']))
-            dbus_connman.service_set_ipv4_configuration(self.servicePath,
-                get_dict(self.struct['IPv4']['settings']))
-            dbus_connman.service_set_ipv6_configuration(self.servicePath,
-                get_dict(self.struct['IPv6']['settings']))
-            dbus_connman.service_set_nameservers_configuration(self.servicePath,
-                get_array(self.struct['Nameservers']['settings']))
-            dbus_connman.service_set_timeservers_configuration(self.servicePath,
-                get_array(self.struct['Timeservers']['settings']))
+            results = dbus_utils.gather(
+                dbus_connman.service_set_autoconnect_async(self.servicePath,
+                    self.struct['AutoConnect']['settings']['AutoConnect']['value']),
+                dbus_connman.service_set_domains_configuration_async(self.servicePath,
+                    get_array(self.struct['Domains']['settings'])),
+                dbus_connman.service_set_ipv4_configuration_async(self.servicePath,
+                    get_dict(self.struct['IPv4']['settings'])),
+                dbus_connman.service_set_ipv6_configuration_async(self.servicePath,
+                    get_dict(self.struct['IPv6']['settings'])),
+                dbus_connman.service_set_nameservers_configuration_async(self.servicePath,
+                    get_array(self.struct['Nameservers']['settings'])),
+                dbus_connman.service_set_timeservers_configuration_async(self.servicePath,
+                    get_array(self.struct['Timeservers']['settings'])),
+                return_exceptions=True).result()
+            for result in results:
+                if isinstance(result, Exception):
+                    log.log(f'Failed to save {self.servicePath}: {repr(result)}', log.ERROR)
         finally:
             return 'close'
 
@@ -661,7 +668,7 @@ class connman(modules.Module):
                 'values': ['Ethernet', 'Interface'],
                 },
             }
-        dbusServices = dbus_connman.manager_get_services()
+        dbusServices = dbus_connman.get_services()
         dbusConnmanManager = None
         rebuildList = 0
         if len(dbusServices) != len(self.listItems) or force:
@@ -721,8 +728,8 @@ class connman(modules.Module):
     def menu_loader(self, menuItem=None):
         if menuItem == None:
             menuItem = oe.winOeMain.getControl(oe.winOeMain.guiMenList).getSelectedItem()
-        self.technologie_properties = dbus_connman.manager_get_technologies()
-        self.clock_properties = dbus_connman.clock_get_properties()
+        self.technologie_properties = dbus_connman.get_technologies()
+        self.clock_properties = dbus_connman.get_clock_properties()
         self.struct[dbus_connman.PATH_TECH_WIFI]['hidden'] = 'true'
         self.struct[dbus_connman.PATH_TECH_ETHERNET]['hidden'] = 'true'
         for (path, technologie) in self.technologie_properties:
@@ -939,7 +946,8 @@ class connman(modules.Module):
     def start_service(self):
         self.load_values()
         self.init_netfilter(service=1)
-        self.agent = Agent()
+        with timeline.TIMELINE.phase('connman/agent'):
+            self.agent = Agent()
         self.listemner = Listener(self)
 
     @log.log_function()
@@ -8,6 +8,7 @@ import modules
 import oe
 import os
 import subprocess
+import shutil
 import xbmc
 import xbmcgui
 
@@ -542,7 +543,7 @@ class services(modules.Module):
         newpwd = xbmcDialog.input(oe._(746))
         if newpwd:
             if newpwd == "libreelec":
-                oe.execute('cp -fp /usr/cache/shadow /storage/.cache/shadow')
+                shutil.copy2('/usr/cache/shadow', '/storage/.cache/shadow')
                 readout3 = "Retype password"
             else:
                 ssh = subprocess.Popen(["passwd"], shell=False, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=0)
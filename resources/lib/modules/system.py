@@ -16,6 +16,7 @@ import tarfile
 import oeWindows
 from xml.dom import minidom
 import subprocess
+import shutil
 
 xbmcDialog = xbmcgui.Dialog()
 
@@ -355,21 +356,23 @@ class system(modules.Module):
             config_file.write('XKBOPTIONS="grp:alt_shift_toggle"\n')
             config_file.close()
             parameters = [
-                '-display ' + os.environ['DISPLAY'],
-                '-layout ' + self.struct['keyboard']['settings']['KeyboardLayout1']['value'] + ',' + self.struct['keyboard']['settings'
+                '-display', os.environ['DISPLAY'],
+                '-layout', self.struct['keyboard']['settings']['KeyboardLayout1']['value'] + ',' + self.struct['keyboard']['settings'
                         ]['KeyboardLayout2']['value'],
-                '-variant ' + self.struct['keyboard']['settings']['KeyboardVariant1']['value'] + ',' + self.struct['keyboard']['settings'
+                '-variant', self.struct['keyboard']['settings']['KeyboardVariant1']['value'] + ',' + self.struct['keyboard']['settings'
                         ]['KeyboardVariant2']['value'],
-                '-model ' + str(self.struct['keyboard']['settings']['KeyboardType']['value']),
-                '-option "grp:alt_shift_toggle"',
+                '-model', str(self.struct['keyboard']['settings']['KeyboardType']['value']),
+                '-option', 'grp:alt_shift_toggle',
                 ]
-            oe.execute('setxkbmap ' + ' '.join(parameters))
+            oe.run(['setxkbmap'] + parameters)
         elif self.nox_keyboard_layouts == True:
             log.log(str(self.struct['keyboard']['settings']['KeyboardLayout1']['value']), log.INFO)
             parameter = self.struct['keyboard']['settings']['KeyboardLayout1']['value']
-            command = f'loadkmap < `ls -1 {self.NOX_KEYBOARD_INFO}/*/{parameter}.bmap`'
-            log.log(command, log.INFO)
-            oe.execute(command)
+            keymaps = sorted(glob.glob(f'{self.NOX_KEYBOARD_INFO}/*/{parameter}.bmap'))
+            log.log(f'loadkmap < {keymaps}', log.INFO)
+            if keymaps:
+                with open(keymaps[0], 'rb') as keymap:
+                    oe.run(['loadkmap'], stdin=keymap).wait()
 
     @log.log_function()
     def set_hostname(self, listItem=None):
@@ -444,7 +447,7 @@ class system(modules.Module):
 
     @log.log_function()
     def set_hw_clock(self):
-        oe.execute(f'{self.SET_CLOCK_CMD} 2>/dev/null')
+        oe.run(self.SET_CLOCK_CMD, quiet=True)
 
     @log.log_function()
     def reset_soft(self, listItem=None):
@@ -548,7 +551,7 @@ class system(modules.Module):
             log.log(f'Restore file: {restore_file_path}', log.INFO)
             restore_file_name = restore_file_path.split('/')[-1]
             if os.path.exists(self.RESTORE_DIR):
-                oe.execute(f'rm -rf {self.RESTORE_DIR}')
+                shutil.rmtree(self.RESTORE_DIR, ignore_errors=True)
             os.makedirs(self.RESTORE_DIR)
             folder_stat = os.statvfs(self.RESTORE_DIR)
             file_size = os.path.getsize(restore_file_path)
@@ -561,7 +564,7 @@ class system(modules.Module):
                     log.log('Restore file successfully copied.', log.INFO)
                 else:
                     log.log(f'Failed to copy restore file to: {self.RESTORE_DIR}', log.ERROR)
-                    oe.execute(f'rm -rf {self.RESTORE_DIR}')
+                    shutil.rmtree(self.RESTORE_DIR, ignore_errors=True)
             else:
                 txt = oe.split_dialog_text(oe._(32379))
                 answer = xbmcDialog.ok('Restore', f'{txt[0]}\n{txt[1]}\n{txt[2]}')
@@ -575,7 +578,7 @@ class system(modules.Module):
                         subprocess.call(['/usr/bin/systemctl', '--no-block', 'reboot'], close_fds=True)
                 else:
                     log.log('User Abort!')
-                    oe.execute(f'rm -rf {self.RESTORE_DIR}')
+                    shutil.rmtree(self.RESTORE_DIR, ignore_errors=True)
 
     @log.log_function()
     def do_send_system_logs(self, listItem=None):
@@ -589,7 +592,13 @@ class system(modules.Module):
     def do_send_logs(self, log_cmd):
         paste_dlg = xbmcgui.DialogProgress()
         paste_dlg.create('Pasting log files', 'Pasting...')
-        result = oe.execute(log_cmd, get_result=1)
+        job = oe.run([log_cmd])
+        while not job.done():
+            if paste_dlg.iscanceled() or oe.xbmcm.waitForAbort(0.2):
+                job.cancel()
+                paste_dlg.close()
+                return
+        result = job.wait().output
         if not paste_dlg.iscanceled():
             paste_dlg.close()
             link = result.find('http')
@@ -3,6 +3,7 @@
 # Copyright (C) 2013 Lutz Fiebach (lufie@openelec.tv)
 # Copyright (C) 2018-present Team LibreELEC
 
+import hardware
 import log
 import modules
 import oe
@@ -18,7 +19,6 @@ import subprocess
 import shutil
 from xml.dom import minidom
 import datetime
-import tempfile
 from functools import cmp_to_key
 
 class updates(modules.Module):
@@ -191,67 +191,10 @@ class updates(modules.Module):
     def exit(self):
         pass
 
-    # Identify connected GPU card (card0, card1 etc.)
-    @log.log_function()
-    def get_gpu_card(self):
-        for root, dirs, files in os.walk("/sys/class/drm", followlinks=False):
-            for dir in dirs:
-                try:
-                    with open(os.path.join(root, dir, 'status'), 'r') as infile:
-                        for line in [x for x in infile if x.replace('\n', '') == 'connected']:
-                            return dir.split("-")[0]
-                except:
-                    pass
-            break
-        return 'card0'
-
-    # Return driver name, eg. 'i915', 'i965', 'nvidia', 'nvidia-legacy', 'amdgpu', 'radeon', 'vmwgfx', 'virtio-pci' etc.
-    @log.log_function()
-    def get_hardware_flags_x86_64(self):
-        gpu_props = {}
-        gpu_driver = ""
-        gpu_card = self.get_gpu_card()
-        oe.dbg_log('updates::get_hardware_flags_x86_64', f'Using card: {gpu_card}', oe.LOGDEBUG)
-        gpu_path = oe.execute(f'/usr/bin/udevadm info --name=/dev/dri/{gpu_card} --query path 2>/dev/null', get_result=1).replace('\n','')
-        oe.dbg_log('updates::get_hardware_flags_x86_64', f'gpu path: {gpu_path}', oe.LOGDEBUG)
-        if gpu_path:
-            drv_path = os.path.dirname(os.path.dirname(gpu_path))
-            props = oe.execute(f'/usr/bin/udevadm info --path={drv_path} --query=property 2>/dev/null', get_result=1)
-            if props:
-                for key, value in [x.strip().split('=') for x in props.strip().split('\n')]:
-                    gpu_props[key] = value
-            oe.dbg_log('updates::get_gpu_type', f'gpu props: {gpu_props}', oe.LOGDEBUG)
-            gpu_driver = gpu_props.get("DRIVER", "")
-        if not gpu_driver:
-            gpu_driver = oe.execute('lspci -k | grep -m1 -A999 "VGA compatible controller" | grep -m1 "Kernel driver in use" | cut -d" " -f5', get_result=1).replace('\n','')
-        if gpu_driver == 'nvidia' and os.path.realpath('/var/lib/nvidia_drv.so').endswith('nvidia-legacy_drv.so'):
-            gpu_driver = 'nvidia-legacy'
-        oe.dbg_log('updates::get_hardware_flags_x86_64', f'gpu driver: {gpu_driver}', oe.LOGDEBUG)
-        return gpu_driver if gpu_driver else "unknown"
-
-    @log.log_function()
-    def get_hardware_flags_dtflag(self):
-        if os.path.exists('/usr/bin/dtflag'):
-            dtflag = oe.execute('/usr/bin/dtflag', get_result=1).rstrip('\x00\n')
-        else:
-            dtflag = "unknown"
-        oe.dbg_log('system::get_hardware_flags_dtflag', f'ARM board: {dtflag}', oe.LOGDEBUG)
-        return dtflag
-
-    @log.log_function()
-    def get_hardware_flags(self):
-        if oe.PROJECT == "Generic":
-            return self.get_hardware_flags_x86_64()
-        elif oe.ARCHITECTURE.split('.')[1] in ['aarch64', 'arm' ]:
-            return self.get_hardware_flags_dtflag()
-        else:
-            oe.dbg_log('updates::get_hardware_flags', f'Project is {oe.PROJECT}, no hardware flag available', oe.LOGDEBUG)
-            return ''
-
     @log.log_function()
     def load_values(self):
         # Hardware flags
-        self.hardware_flags = self.get_hardware_flags()
+        self.hardware_flags = oe.HARDWARE.hardware_flags
         oe.dbg_log('system::load_values', f'loaded hardware_flag {self.hardware_flags}', oe.LOGDEBUG)
 
         # AutoUpdate
@@ -534,13 +477,13 @@ class updates(modules.Module):
                         'vl805': {'state': '', 'current': 'unknown', 'latest': 'unknown'}
                     }
 
-            with tempfile.NamedTemporaryFile(mode='r', delete=True) as machine_out:
-                console_output = oe.execute(f'/usr/bin/.rpi-eeprom-update.real -j -m "{machine_out.name}"', get_result=1).split('\n')
-                if os.path.getsize(machine_out.name) != 0:
-                    state['incompatible'] = False
-                    jdata = json.load(machine_out)
+            # probed at startup, the report is read again when the menu loads
+            if not hasattr(self, 'is_service'):
+                oe.HARDWARE = oe.HARDWARE._replace(rpi_eeprom=hardware.get_rpi_eeprom())
+            if oe.HARDWARE.rpi_eeprom is not None:
+                state['incompatible'] = False
+                jdata = oe.HARDWARE.rpi_eeprom
 
-            oe.dbg_log('updates::get_rpi_flashing_state', f'console output: {console_output}', oe.LOGDEBUG)
             oe.dbg_log('updates::get_rpi_flashing_state', f'json values: {jdata}', oe.LOGDEBUG)
 
             if jdata['BOOTLOADER_CURRENT'] != 0:
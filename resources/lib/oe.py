@@ -16,13 +16,22 @@ import sys
 import urllib.request, urllib.error, urllib.parse
 import time
 import tarfile
+import threading
 import traceback
-import subprocess
 import defaults
 import shutil
 import hashlib, binascii
+import dbus_systemd
+import hardware
+import module_registry
+import probe_cache
+import process_tools
+import service_config
+import settings
+import startup
+import timeline
+import translations
 
-from xml.dom import minidom
 import imp
 
 from xbmc import LOGDEBUG, LOGINFO, LOGWARNING, LOGERROR
@@ -38,10 +47,17 @@ xbmcDialog = xbmcgui.Dialog()
 xbmcm = xbmc.Monitor()
 
 is_service = False
-conf_lock = False
 xbmcIsPlaying = 0
 input_request = False
 dictModules = {}
+winOeMain = None
+main_window = None
+main_window_lock = threading.Lock()
+# set from an open request until the main window is closed again
+main_window_opening = False
+setting_cache = {}
+catalog = (None, {})
+service_plan = None
 listObject = {
     'list': 1100,
     'netlist': 1200,
@@ -119,10 +135,19 @@ class PINStorage:
             self.write('enable', self.enabled)
 
     def disable(self):
-        if self.isEnabled():
-            self.enabled = '0'
-            self.write('enable', self.enabled)
-        self.set(None)
+        # SETTINGS.write raises, unlike write_setting, so a failed write rolls
+        # back both values and the attributes only change once they are saved
+        try:
+            with settings_transaction():
+                if self.isEnabled():
+                    SETTINGS.write(self.module, f'{self.prefix}_enable', '0')
+                if self.isSet():
+                    SETTINGS.write(self.module, f'{self.prefix}_pin', '')
+        except Exception as e:
+            dbg_log('oe::PINStorage::disable', f'ERROR: ({repr(e)})')
+            return
+        self.enabled = '0'
+        self.salthash = None
 
     def set(self, value):
         oldSaltHash = self.salthash
@@ -145,18 +170,19 @@ class PINStorage:
         newhash = binascii.hexlify(newhash).decode('ascii')
         return oldhash == newhash
 
+    def write_items(self, items):
+        return write_settings(self.module, {f'{self.prefix}_{item}': str(value) if value else '' for item, value in items.items()})
+
     def fail(self):
         self.numFail += 1
         self.timeFail = time.time()
-        self.write('numFail', self.numFail)
-        self.write('timeFail', self.timeFail)
+        self.write_items({'numFail': self.numFail, 'timeFail': self.timeFail})
 
     def success(self):
         if self.numFail != 0 or self.timeFail != 0.0:
             self.numFail = 0
             self.timeFail = 0.0
-            self.write('numFail', self.numFail)
-            self.write('timeFail', self.timeFail)
+            self.write_items({'numFail': self.numFail, 'timeFail': self.timeFail})
 
     def isDelayed(self):
         self.now = time.time()
@@ -268,28 +294,23 @@ class ProgressDialog:
         return self.cancelled
 
 def _(code):
-    wizardComp = read_setting('libreelec', 'wizard_completed')
+    wizardComp = read_cached_setting('libreelec', 'wizard_completed')
     if wizardComp == "True":
+        return __addon__.getLocalizedString(code)
+    codeNew = get_catalog(read_cached_setting('system', 'language')).get(code)
+    if codeNew is None:
         codeNew = __addon__.getLocalizedString(code)
-    else:
-        curLang = read_setting("system", "language")
-        if curLang is not None:
-            lang_file = os.path.join(__cwd__, 'resources', 'language', str(curLang), 'strings.po')
-            with open(lang_file, encoding='utf-8') as fp:
-                contents = fp.read().split('\n\n')
-                for strings in contents:
-                    if str(code) in strings:
-                        subString = strings.split('msgstr ')[1]
-                        subStringClean = re.sub('"', '', subString)
-                        codeNew = subStringClean
-                        break
-                    else:
-                        codeNew = __addon__.getLocalizedString(code)
-        else:
-            codeNew = __addon__.getLocalizedString(code)
     return codeNew
 
 
+def get_catalog(language):
+    global catalog
+    if catalog[0] != language:
+        strings = translations.open_catalog(__cwd__, language, f'{CONFIG_CACHE}/translations') if language else {}
+        catalog = (language, strings)
+    return catalog[1]
+
+
 def dbg_log(source, text, level=LOGERROR):
     if level == LOGDEBUG and os.environ.get('DEBUG', 'no') == 'no':
         return
@@ -313,21 +334,19 @@ def execute(command_line, get_result=0):
     try:
         dbg_log('oe::execute', 'enter_function', LOGDEBUG)
         dbg_log('oe::execute::command', command_line, LOGDEBUG)
-        if get_result == 0:
-            process = subprocess.Popen(command_line, shell=True, close_fds=True)
-            process.wait()
-        else:
-            result = ''
-            process = subprocess.Popen(command_line, shell=True, close_fds=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            process.wait()
-            for line in process.stdout.readlines():
-                result = result + line.decode('utf-8')
-            return result
+        result = process_tools.run(['/bin/sh', '-c', command_line])
+        if get_result != 0:
+            return result.output
         dbg_log('oe::execute', 'exit_function', LOGDEBUG)
     except Exception as e:
         dbg_log('oe::execute', f'ERROR: ({repr(e)})')
 
 
+def run(argv, timeout=None, stdin=None, quiet=False, on_output=None):
+    dbg_log('oe::run::command', argv, LOGDEBUG)
+    return process_tools.start(argv, timeout=timeout, stdin=stdin, quiet=quiet, on_output=on_output).log_failures()
+
+
 def enable_service(service):
     try:
         if os.path.exists(f'{CONFIG_CACHE}/services/{service}'):
@@ -341,49 +360,27 @@ def enable_service(service):
 
 def set_service_option(service, option, value):
     try:
-        lines = []
-        changed = False
-        conf_file_name = f'{CONFIG_CACHE}/services/{service}.conf'
-        if os.path.isfile(conf_file_name):
-            with open(conf_file_name, 'r') as conf_file:
-                for line in conf_file:
-                    if option in line:
-                        line = f'{option}={value}'
-                        changed = True
-                    lines.append(line.strip())
-        if changed == False:
-            lines.append(f'{option}={value}')
-        with open(conf_file_name, 'w') as conf_file:
-            conf_file.write('\n'.join(lines) + '\n')
+        SERVICES.set_option(service, option, value)
     except Exception as e:
         dbg_log('oe::set_service_option', f'ERROR: ({repr(e)})')
 
 
 def get_service_option(service, option, default=None):
     try:
-        lines = []
-        conf_file_name = ''
-        if os.path.exists(f'{CONFIG_CACHE}/services/{service}.conf'):
-            conf_file_name = f'{CONFIG_CACHE}/services/{service}.conf'
-        if os.path.exists(f'{CONFIG_CACHE}/services/{service}.disabled'):
-            conf_file_name = f'{CONFIG_CACHE}/services/{service}.disabled'
-        if os.path.exists(conf_file_name):
-            with open(conf_file_name, 'r') as conf_file:
-                for line in conf_file:
-                    if option in line:
-                        if '=' in line:
-                            default = line.strip().split('=')[-1]
-        return default
+        pending = pending_service(service)
+        if pending is not None and pending[1] == 1:
+            return pending[0].get(option, default)
+        return SERVICES.get_option(service, option, default)
     except Exception as e:
         dbg_log('oe::get_service_option', f'ERROR: ({repr(e)})')
 
 
 def get_service_state(service):
     try:
-        if os.path.exists(f'{CONFIG_CACHE}/services/{service}.conf'):
-            return '1'
-        else:
-            return '0'
+        pending = pending_service(service)
+        if pending is not None:
+            return '1' if pending[1] == 1 else '0'
+        return SERVICES.get_state(service)
     except Exception as e:
         dbg_log('oe::get_service_state', f'ERROR: ({repr(e)})')
 
@@ -394,41 +391,48 @@ def set_service(service, options, state):
         dbg_log('oe::set_service::service', repr(service), LOGDEBUG)
         dbg_log('oe::set_service::options', repr(options), LOGDEBUG)
         dbg_log('oe::set_service::state', repr(state), LOGDEBUG)
-        config = {}
-        changed = False
+        # only start_service of the modules is deferred, other callers apply at once
+        plan = service_plan
+        if plan is not None and startup.in_startup_thread():
+            plan.set_state(service, options, state)
+            return
+        if plan is not None:
+            # applying the plan would otherwise overwrite this state
+            plan.discard(service)
+        changed = SERVICES.set_state(service, options, state)
+        if changed:
+            if startup.in_startup_thread():
+                # a module that timed out at boot, its units are not restarted either
+                dbg_log('oe::set_service', f'{service} set after the startup plan was applied, not restarting it', LOGWARNING)
+            elif service in defaults._services:
+                dbus_systemd.manager_restart_units(defaults._services[service])
+        dbg_log('oe::set_service', 'exit_function', LOGDEBUG)
+    except Exception as e:
+        dbg_log('oe::set_service', f'ERROR: ({repr(e)})')
 
-        # Service Enabled
 
-        if state == 1:
+def pending_service(service):
+    """(options, state) of service deferred by the startup plan, or None"""
+    plan = service_plan
+    return plan.pending(service) if plan is not None else None
 
-            # Is Service alwys enabled ?
 
-            if get_service_state(service) == '1':
-                cfn = f'{CONFIG_CACHE}/services/{service}.conf'
-                cfo = cfn
-            else:
-                cfn = f'{CONFIG_CACHE}/services/{service}.conf'
-                cfo = f'{CONFIG_CACHE}/services/{service}.disabled'
-            if os.path.exists(cfo) and not cfo == cfn:
-                os.remove(cfo)
-            with open(cfn, 'w') as cf:
-                for option in options:
-                    cf.write(f'{option}={options[option]}\n')
-        else:
+def begin_service_plan():
+    global service_plan
+    service_plan = service_config.ServicePlan(SERVICES)
 
-        # Service Disabled
 
-            cfo = f'{CONFIG_CACHE}/services/{service}.conf'
-            cfn = f'{CONFIG_CACHE}/services/{service}.disabled'
-            if os.path.exists(cfo):
-                os.rename(cfo, cfn)
-        if not __oe__.is_service:
-            if service in defaults._services:
-                for svc in defaults._services[service]:
-                    execute(f'systemctl restart {svc}')
-        dbg_log('oe::set_service', 'exit_function', LOGDEBUG)
+def apply_service_plan():
+    global service_plan
+    try:
+        plan, service_plan = service_plan, None
+        if plan is None:
+            return
+        # as when the states were written one by one, units are not restarted at boot
+        changed = plan.commit()
+        dbg_log('oe::apply_service_plan::changed', repr(changed), LOGDEBUG)
     except Exception as e:
-        dbg_log('oe::set_service', f'ERROR: ({repr(e)})')
+        dbg_log('oe::apply_service_plan', f'ERROR: ({repr(e)})')
 
 
 def load_file(filename):
@@ -553,13 +557,20 @@ def start_service():
     global dictModules, __oe__
     try:
         __oe__.is_service = True
+        begin_service_plan()
+        modules = {}
         for strModule in sorted(dictModules, key=lambda x: list(dictModules[x].menu.keys())):
             module = dictModules[strModule]
-            if hasattr(module, 'start_service') and module.ENABLED:
-                module.start_service()
+            if module_registry.is_loaded(module) and hasattr(module, 'start_service') and module.ENABLED:
+                modules[strModule] = module
+        origin = time.monotonic()
+        for timing in startup.start_modules(modules):
+            timeline.TIMELINE.add(f'start_service/{timing.name}', origin + timing.start, timing.duration)
         __oe__.is_service = False
     except Exception as e:
         dbg_log('oe::start_service', f'ERROR: ({repr(e)})')
+    with timeline.TIMELINE.phase('start_service/apply'):
+        apply_service_plan()
 
 
 def stop_service():
@@ -567,11 +578,12 @@ def stop_service():
     try:
         for strModule in dictModules:
             module = dictModules[strModule]
-            if hasattr(module, 'stop_service') and module.ENABLED:
+            if module_registry.is_loaded(module) and hasattr(module, 'stop_service') and module.ENABLED:
                 module.stop_service()
         xbmc.log('## LibreELEC Addon ## STOP SERVICE DONE !')
     except Exception as e:
         dbg_log('oe::stop_service', f'ERROR: ({repr(e)})')
+    close_config()
 
 
 def openWizard():
@@ -579,13 +591,18 @@ def openWizard():
     try:
         winOeMain = oeWindows.wizard('service-LibreELEC-Settings-wizard.xml', __cwd__, 'Default', oeMain=__oe__)
         winOeMain.doModal()
-        winOeMain = oeWindows.mainWindow('service-LibreELEC-Settings-mainWindow.xml', __cwd__, 'Default', oeMain=__oe__)  # None
+        winOeMain = None
     except Exception as e:
         dbg_log('oe::openWizard', f'ERROR: ({repr(e)})')
 
 
 def openConfigurationWindow():
-    global winOeMain, __cwd__, __oe__, dictModules, PIN
+    global winOeMain, __cwd__, __oe__, dictModules, PIN, main_window_opening
+    with main_window_lock:
+        if main_window_opening:
+            dbg_log('oe::openConfigurationWindow', 'already opening', LOGDEBUG)
+            return
+        main_window_opening = True
     try:
         match = True
 
@@ -619,15 +636,51 @@ def openConfigurationWindow():
               return
 
         if match == True:
-            winOeMain = oeWindows.mainWindow('service-LibreELEC-Settings-mainWindow.xml', __cwd__, 'Default', oeMain=__oe__)
+            winOeMain = get_main_window()
             winOeMain.doModal()
             for strModule in dictModules:
-                dictModules[strModule].exit()
+                if module_registry.is_loaded(dictModules[strModule]):
+                    dictModules[strModule].exit()
             winOeMain = None
-            del winOeMain
 
     except Exception as e:
         dbg_log('oe::openConfigurationWindow', f'ERROR: ({repr(e)})')
+    finally:
+        with main_window_lock:
+            main_window_opening = False
+
+def get_main_window():
+    """The main window, created on first use and reused for every open"""
+    global main_window
+    with main_window_lock:
+        if main_window is None:
+            with timeline.TIMELINE.phase('oe/winOeMain'):
+                main_window = oeWindows.mainWindow('service-LibreELEC-Settings-mainWindow.xml', __cwd__, 'Default', oeMain=__oe__)
+        return main_window
+
+
+def window_visible():
+    return winOeMain is not None and getattr(winOeMain, 'visible', False) == True
+
+
+def prewarm_main_window():
+    """Create the main window on a background thread once Kodi is idle"""
+    def prewarm():
+        try:
+            if xbmcm.waitForAbort(defaults.PREWARM_DELAY):
+                return
+            while main_window is None and xbmc.getGlobalIdleTime() < defaults.PREWARM_IDLE:
+                if xbmcm.waitForAbort(defaults.PREWARM_IDLE):
+                    return
+            get_main_window()
+        except Exception as e:
+            dbg_log('oe::prewarm_main_window', f'ERROR: ({repr(e)})')
+
+    if defaults.PREWARM_WINDOW:
+        thread = threading.Thread(target=prewarm, name='prewarm')
+        thread.daemon = True
+        thread.start()
+
 
 def standby_devices():
     global dictModules
@@ -639,140 +692,111 @@ def standby_devices():
 
 def load_config():
     try:
-        global conf_lock
-        while conf_lock:
-            time.sleep(0.2)
-        conf_lock = True
-        if os.path.exists(configFile):
-            config_file = open(configFile, 'r')
-            config_text = config_file.read()
-            config_file.close()
-        else:
-            config_text = ''
-        if config_text == '':
-            xml_conf = minidom.Document()
-            xml_main = xml_conf.createElement('libreelec')
-            xml_conf.appendChild(xml_main)
-            xml_sub = xml_conf.createElement('addon_config')
-            xml_main.appendChild(xml_sub)
-            xml_sub = xml_conf.createElement('settings')
-            xml_main.appendChild(xml_sub)
-            config_text = xml_conf.toprettyxml()
-        else:
-            xml_conf = minidom.parseString(config_text)
-        conf_lock = False
-        return xml_conf
+        return SETTINGS.load_xml()
     except Exception as e:
         dbg_log('oe::load_config', f'ERROR: ({repr(e)})')
 
 
 def save_config(xml_conf):
     try:
-        global configFile, conf_lock
-        while conf_lock:
-            time.sleep(0.2)
-        conf_lock = True
-        config_file = open(configFile, 'w')
-        config_file.write(xml_conf.toprettyxml())
-        config_file.close()
-        conf_lock = False
+        SETTINGS.save(xml_conf)
     except Exception as e:
         dbg_log('oe::save_config', f'ERROR: ({repr(e)})')
 
 
+def export_config(path=None):
+    try:
+        SETTINGS.export_xml(path or configFile)
+    except Exception as e:
+        dbg_log('oe::export_config', f'ERROR: ({repr(e)})')
+
+
+def flush_config():
+    try:
+        SETTINGS.flush()
+    except Exception as e:
+        dbg_log('oe::flush_config', f'ERROR: ({repr(e)})')
+
+
+def close_config():
+    try:
+        SETTINGS.close()
+    except Exception as e:
+        dbg_log('oe::close_config', f'ERROR: ({repr(e)})')
+
+
+def subscribe(module, setting, callback, main_node='settings'):
+    try:
+        SETTINGS.subscribe(module, setting, callback, main_node)
+    except Exception as e:
+        dbg_log('oe::subscribe', f'ERROR: ({repr(e)})')
+
+
+def unsubscribe(module, setting, callback, main_node='settings'):
+    try:
+        SETTINGS.unsubscribe(module, setting, callback, main_node)
+    except Exception as e:
+        dbg_log('oe::unsubscribe', f'ERROR: ({repr(e)})')
+
+
+def cache_setting(module, setting, value):
+    setting_cache[(module, setting)] = value
+
+
+def read_cached_setting(module, setting):
+    key = (module, setting)
+    if key not in setting_cache:
+        subscribe(module, setting, cache_setting)
+        setting_cache[key] = read_setting(module, setting)
+    return setting_cache[key]
+
+
 def read_module(module):
     try:
-        xml_conf = load_config()
-        xml_settings = xml_conf.getElementsByTagName('settings')
-        for xml_setting in xml_settings:
-            for xml_modul in xml_setting.getElementsByTagName(module):
-                return xml_modul
+        return SETTINGS.read_module(module)
     except Exception as e:
         dbg_log('oe::read_module', f'ERROR: ({repr(e)})')
 
 
 def read_node(node_name):
     try:
-        xml_conf = load_config()
-        xml_node = xml_conf.getElementsByTagName(node_name)
-        value = {}
-        for xml_main_node in xml_node:
-            value[xml_main_node.nodeName] = {}
-            for xml_sub_node in xml_main_node.childNodes:
-                if len(xml_sub_node.childNodes) == 0:
-                    continue
-                value[xml_main_node.nodeName][xml_sub_node.nodeName] = {}
-                for xml_value in xml_sub_node.childNodes:
-                    if hasattr(xml_value.firstChild, 'nodeValue'):
-                        value[xml_main_node.nodeName][xml_sub_node.nodeName][xml_value.nodeName] = xml_value.firstChild.nodeValue
-                    else:
-                        value[xml_main_node.nodeName][xml_sub_node.nodeName][xml_value.nodeName] = ''
-        return value
+        return SETTINGS.read_node(node_name)
     except Exception as e:
         dbg_log('oe::read_node', f'ERROR: ({repr(e)})')
 
 
 def remove_node(node_name):
     try:
-        xml_conf = load_config()
-        xml_node = xml_conf.getElementsByTagName(node_name)
-        for xml_main_node in xml_node:
-            xml_main_node.parentNode.removeChild(xml_main_node)
-        save_config(xml_conf)
+        SETTINGS.remove_node(node_name)
     except Exception as e:
         dbg_log('oe::remove_node', f'ERROR: ({repr(e)})')
 
 
 def read_setting(module, setting, default=None):
     try:
-        xml_conf = load_config()
-        xml_settings = xml_conf.getElementsByTagName('settings')
-        value = default
-        for xml_setting in xml_settings:
-            for xml_modul in xml_setting.getElementsByTagName(module):
-                for xml_modul_setting in xml_modul.getElementsByTagName(setting):
-                    if hasattr(xml_modul_setting.firstChild, 'nodeValue'):
-                        value = xml_modul_setting.firstChild.nodeValue
-        return value
+        return SETTINGS.read(module, setting, default)
     except Exception as e:
         dbg_log('oe::read_setting', f'ERROR: ({repr(e)})')
 
 
 def write_setting(module, setting, value, main_node='settings'):
     try:
-        xml_conf = load_config()
-        xml_settings = xml_conf.getElementsByTagName(main_node)
-        if len(xml_settings) == 0:
-            for xml_main in xml_conf.getElementsByTagName('libreelec'):
-                xml_sub = xml_conf.createElement(main_node)
-                xml_main.appendChild(xml_sub)
-                xml_settings = xml_conf.getElementsByTagName(main_node)
-        module_found = 0
-        setting_found = 0
-        for xml_setting in xml_settings:
-            for xml_modul in xml_setting.getElementsByTagName(module):
-                module_found = 1
-                for xml_modul_setting in xml_modul.getElementsByTagName(setting):
-                    setting_found = 1
-        if setting_found == 1:
-            if hasattr(xml_modul_setting.firstChild, 'nodeValue'):
-                xml_modul_setting.firstChild.nodeValue = value
-            else:
-                xml_value = xml_conf.createTextNode(value)
-                xml_modul_setting.appendChild(xml_value)
-        else:
-            if module_found == 0:
-                xml_modul = xml_conf.createElement(module)
-                xml_setting.appendChild(xml_modul)
-            xml_setting = xml_conf.createElement(setting)
-            xml_modul.appendChild(xml_setting)
-            xml_value = xml_conf.createTextNode(value)
-            xml_setting.appendChild(xml_value)
-        save_config(xml_conf)
+        SETTINGS.write(module, setting, value, main_node)
     except Exception as e:
         dbg_log('oe::write_setting', f'ERROR: ({repr(e)})')
 
 
+def write_settings(module, values, main_node='settings'):
+    try:
+        SETTINGS.write_settings(module, values, main_node)
+    except Exception as e:
+        dbg_log('oe::write_settings', f'ERROR: ({repr(e)})')
+
+
+def settings_transaction():
+    return SETTINGS.transaction()
+
+
 def load_modules():
 
   # # load libreelec configuration modules
@@ -790,16 +814,32 @@ def load_modules():
         for module_name in dict_names:
             try:
                 if not module_name in dictModules:
-                    dictModules[module_name] = getattr(__import__(module_name), module_name)(__oe__)
-                    if hasattr(defaults, module_name):
-                        for key in getattr(defaults, module_name):
-                            setattr(dictModules[module_name], key, getattr(defaults, module_name)[key])
+                    declaration = MODULE_DECLARATIONS.get(f'{__cwd__}/resources/lib/modules/{module_name}.py', module_name)
+                    if declaration is None:
+                        dictModules[module_name] = create_module(module_name)
+                        continue
+                    declaration.setdefault('menu', {})
+                    declaration['ENABLED'] = getattr(defaults, module_name, {}).get('ENABLED', declaration.get('ENABLED', False))
+                    dictModules[module_name] = module_registry.ModuleProxy(module_name, declaration, lambda module_name=module_name: create_module(module_name))
+                    # modules are created on first use, unless they have to start with the service
+                    if declaration['defines_start_service']:
+                        dictModules[module_name].load()
             except Exception as e:
                 dbg_log('oe::MAIN(loadingModules)(strModule)', f'ERROR: ({repr(e)})')
+        MODULE_DECLARATIONS.save()
     except Exception as e:
         dbg_log('oe::MAIN(loadingModules)', f'ERROR: ({repr(e)})')
 
 
+def create_module(module_name):
+    with timeline.TIMELINE.phase(f'load_modules/{module_name}'):
+        module = getattr(__import__(module_name), module_name)(__oe__)
+        if hasattr(defaults, module_name):
+            for key in getattr(defaults, module_name):
+                setattr(module, key, getattr(defaults, module_name)[key])
+    return module
+
+
 def timestamp():
     localtime = time.localtime()
     return time.strftime('%Y%m%d%H%M%S', localtime)
@@ -835,38 +875,13 @@ def exit():
 
     # del winOeMain
 
+    flush_config()
     del dictModules
     del __addon__
     del __oe__
     del _
 
 
-# fix for xml printout
-
-def fixed_writexml(self, writer, indent='', addindent='', newl=''):
-    writer.write(f'{indent}<{self.tagName}')
-    attrs = self._get_attributes()
-    a_names = list(attrs.keys())
-    a_names.sort()
-    for a_name in a_names:
-        writer.write(f' {a_name}="')
-        minidom._write_data(writer, attrs[a_name].value)
-        writer.write('"')
-    if self.childNodes:
-        if len(self.childNodes) == 1 and self.childNodes[0].nodeType == minidom.Node.TEXT_NODE:
-            writer.write('>')
-            self.childNodes[0].writexml(writer, '', '', '')
-            writer.write(f'</{self.tagName}>{newl}')
-            return
-        writer.write(f'>{newl}')
-        for node in self.childNodes:
-            if node.nodeType is not minidom.Node.TEXT_NODE:
-                node.writexml(writer, indent + addindent, addindent, newl)
-        writer.write(f'{indent}</{self.tagName}>{newl}')
-    else:
-        writer.write(f'/>{newl}')
-
-
 def parse_os_release():
     os_release_fields = re.compile(r'(?!#)(?P<key>.+)=(?P<quote>[\'\"]?)(?P<value>.+)(?P=quote)$')
     os_release_unescape = re.compile(r'\\(?P<escaped>[\'\"\\])')
@@ -917,8 +932,6 @@ def get_os_release():
             builder_version
             )
 
-minidom.Element.writexml = fixed_writexml
-
 ############################################################################################
 # Base Environment
 ############################################################################################
@@ -937,18 +950,12 @@ XBMC_USER_HOME = os.environ.get('XBMC_USER_HOME', '/storage/.kodi')
 CONFIG_CACHE = os.environ.get('CONFIG_CACHE', '/storage/.cache')
 USER_CONFIG = os.environ.get('USER_CONFIG', '/storage/.config')
 TEMP = f'{XBMC_USER_HOME}/temp/'
-winOeMain = oeWindows.mainWindow('service-LibreELEC-Settings-mainWindow.xml', __cwd__, 'Default', oeMain=__oe__)
-if os.path.exists('/etc/machine-id'):
-    SYSTEMID = load_file('/etc/machine-id')
-else:
-    SYSTEMID = os.environ.get('SYSTEMID', '')
-
-if PROJECT == 'RPi':
-  RPI_CPU_VER = execute('vcgencmd otp_dump 2>/dev/null | grep 30: | cut -c8', get_result=1).replace('\n','')
-else:
-  RPI_CPU_VER = ''
-
-BOOT_STATUS = load_file('/storage/.config/boot.status')
+PROBES = probe_cache.ProbeCache(f'{CONFIG_CACHE}/libreelec/probes.json')
+with timeline.TIMELINE.phase('oe/hardware'):
+    HARDWARE = hardware.collect(PROJECT, ARCHITECTURE, PROBES)
+SYSTEMID = HARDWARE.system_id
+RPI_CPU_VER = HARDWARE.rpi_cpu_ver
+BOOT_STATUS = HARDWARE.boot_status
 
 ############################################################################################
 
@@ -961,4 +968,9 @@ try:
 except:
     pass
 
+settings_backend = settings.BACKENDS.get(defaults.SETTINGS_BACKEND, settings.XmlDocument)
+SERVICES = service_config.ServiceConfigs(f'{CONFIG_CACHE}/services')
+MODULE_DECLARATIONS = module_registry.Declarations(f'{CONFIG_CACHE}/libreelec/modules.json')
+SETTINGS = settings.Settings(f'{os.path.splitext(configFile)[0]}{settings_backend.extension}', settings.WRITE_DELAY,
+                             file_lock=True, backend=settings_backend, legacy_path=configFile)
 PIN = PINStorage()
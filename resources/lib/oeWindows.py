@@ -72,6 +72,11 @@ class mainWindow(xbmcgui.WindowXMLDialog):
             self.setProperty('version', oe.VERSION)
             self.setProperty('build', oe.BUILD)
             oe.winOeMain = self
+            # the window is reused, drop the items and selection of the previous open
+            self.getControl(self.guiMenList).reset()
+            self.lastMenu = -1
+            self.lastGuiList = -1
+            self.lastListType = -1
             for strModule in sorted(oe.dictModules, key=lambda x: list(oe.dictModules[x].menu.keys())):
                 module = oe.dictModules[strModule]
                 oe.dbg_log('init module', strModule, oe.LOGDEBUG)
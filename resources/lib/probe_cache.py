@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import concurrent.futures
+import json
+import os
+import subprocess
+import threading
+
+import log
+import process_tools
+import settings
+
+BOOT_ID = '/proc/sys/kernel/random/boot_id'
+
+
+def get_boot_id():
+    try:
+        with open(BOOT_ID) as boot_id:
+            return boot_id.read().strip()
+    except OSError:
+        return None
+
+
+class ProbeCache(object):
+    """
+    Output of hardware probe commands, kept for the current boot
+
+    The results are stored in a JSON file together with the kernel boot id
+    and thrown away once the boot id changes, so every command runs at most
+    once per boot. Commands that could not be run or failed are not cached.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.boot_id = get_boot_id()
+        self.probes = None
+
+    def load(self):
+        # the lock must be held
+        if self.probes is not None:
+            return self.probes
+        self.probes = {}
+        try:
+            with open(self.path) as cache_file:
+                cache = json.load(cache_file)
+            if self.boot_id is not None and cache.get('boot_id') == self.boot_id:
+                self.probes = cache.get('probes', {})
+        except (OSError, ValueError) as e:
+            log.log(f'Probe cache not loaded: {repr(e)}', log.DEBUG)
+        return self.probes
+
+    def save(self):
+        # the lock must be held
+        if self.boot_id is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            settings.write_atomic(self.path, json.dumps({'boot_id': self.boot_id, 'probes': self.probes}))
+        except OSError as e:
+            log.log(f'Failed to write {self.path}: {repr(e)}', log.ERROR)
+
+    def output(self, argv, quiet=False, timeout=None):
+        """
+        Same as process_tools.output, run once per boot
+
+        Probes take no input, so only the options that change the output
+        are accepted and they are part of the key. A command that exits
+        with an error is not cached and runs again on the next call.
+        """
+        key = json.dumps([[str(arg) for arg in argv], quiet, timeout])
+        with self.lock:
+            probes = self.load()
+            if key in probes:
+                return probes[key]
+        try:
+            result = process_tools.run(argv, quiet=quiet, timeout=timeout)
+        except (OSError, subprocess.SubprocessError, concurrent.futures.CancelledError) as e:
+            log.log(f'Failed to run {argv}: {repr(e)}', log.ERROR)
+            return ''
+        if result.returncode != 0:
+            log.log(f'{argv} exited with {result.returncode}, not caching its output', log.WARNING)
+            return result.output
+        with self.lock:
+            self.probes[key] = result.output
+            self.save()
+        return result.output
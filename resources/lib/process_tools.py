@@ -0,0 +1,129 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import asyncio
+import collections
+import concurrent.futures
+import subprocess
+import threading
+
+import log
+
+POOL_SIZE = 4
+
+Result = collections.namedtuple('Result', ['returncode', 'output'])
+
+POOL = concurrent.futures.ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='process')
+
+
+class Job(object):
+    """
+    Command queued on the process pool
+
+    The command runs without a shell, its output is read line by line while
+    it runs and passed to on_output, if given. stderr is merged into the
+    output unless quiet is set, in which case it is discarded. A command
+    that runs longer than timeout seconds is killed.
+
+    Call wait() to block until the result is available, or await the job
+    from a coroutine. cancel() drops a queued job and kills a running one.
+    """
+
+    def __init__(self, argv, timeout=None, stdin=None, quiet=False, on_output=None):
+        self.argv = [str(arg) for arg in argv]
+        self.timeout = timeout
+        self.stdin = stdin
+        self.quiet = quiet
+        self.on_output = on_output
+        self.lock = threading.Lock()
+        self.process = None
+        self.cancelled = False
+        self.timed_out = False
+        self.future = POOL.submit(self.execute)
+
+    def execute(self):
+        with self.lock:
+            if self.cancelled:
+                raise concurrent.futures.CancelledError()
+            self.process = subprocess.Popen(
+                self.argv,
+                stdin=subprocess.DEVNULL if self.stdin is None else self.stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL if self.quiet else subprocess.STDOUT,
+                close_fds=True)
+        timer = None
+        if self.timeout is not None:
+            timer = threading.Timer(self.timeout, self.on_timeout)
+            timer.daemon = True
+            timer.start()
+        output = []
+        try:
+            for line in self.process.stdout:
+                line = line.decode('utf-8', errors='replace')
+                output.append(line)
+                if self.on_output is not None:
+                    self.on_output(line)
+        finally:
+            self.process.stdout.close()
+            returncode = self.process.wait()
+            if timer is not None:
+                timer.cancel()
+        if self.cancelled:
+            raise concurrent.futures.CancelledError()
+        if self.timed_out:
+            raise subprocess.TimeoutExpired(self.argv, self.timeout, ''.join(output))
+        return Result(returncode, ''.join(output))
+
+    def on_timeout(self):
+        log.log(f'Killing {self.argv} after {self.timeout}s', log.WARNING)
+        self.timed_out = True
+        self.kill()
+
+    def kill(self):
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+
+    def cancel(self):
+        self.cancelled = True
+        if not self.future.cancel():
+            self.kill()
+
+    def done(self):
+        return self.future.done()
+
+    def log_failures(self):
+        """Log the job if it can not be run or exits with an error, for callers that do not wait"""
+        self.future.add_done_callback(self.on_done)
+        return self
+
+    def on_done(self, future):
+        if future.cancelled() or isinstance(future.exception(), concurrent.futures.CancelledError):
+            return
+        if future.exception() is not None:
+            log.log(f'Failed to run {self.argv}: {repr(future.exception())}', log.ERROR)
+        elif future.result().returncode != 0:
+            log.log(f'{self.argv} exited with {future.result().returncode}: {future.result().output.strip()}', log.WARNING)
+
+    def wait(self, timeout=None):
+        return self.future.result(timeout)
+
+    def __await__(self):
+        return asyncio.wrap_future(self.future).__await__()
+
+
+def start(argv, **kwargs):
+    return Job(argv, **kwargs)
+
+
+def run(argv, **kwargs):
+    return Job(argv, **kwargs).wait()
+
+
+def output(argv, **kwargs):
+    """Return the output of argv, or '' if it could not be run"""
+    try:
+        return run(argv, **kwargs).output
+    except (OSError, subprocess.SubprocessError, concurrent.futures.CancelledError) as e:
+        log.log(f'Failed to run {argv}: {repr(e)}', log.ERROR)
+        return ''
@@ -0,0 +1,141 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import os
+import threading
+
+import log
+import settings
+
+
+def parse_options(config_text):
+    options = {}
+    for line in config_text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        option, separator, value = line.partition('=')
+        if separator:
+            options[option.strip()] = value.strip()
+    return options
+
+
+def format_options(options):
+    return ''.join(f'{option}={value}\n' for option, value in options.items())
+
+
+class ServiceConfigs(object):
+    """
+    Options of the services in CONFIG_CACHE/services
+
+    A service is enabled by <service>.conf and disabled by renaming it to
+    <service>.disabled, both hold shell style option=value lines. Files are
+    parsed once and kept until their inode, mtime or size changes. Files
+    are replaced atomically and only if their content changes.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.cache = {}
+
+    def path(self, service, enabled=True):
+        return os.path.join(self.directory, f'{service}.conf' if enabled else f'{service}.disabled')
+
+    def read_file(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.cache.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        with open(path, 'r') as config_file:
+            options = parse_options(config_file.read())
+        with self.lock:
+            self.cache[path] = (stamp, options)
+        return options
+
+    def write_file(self, path, options):
+        config_text = format_options(options)
+        try:
+            with open(path, 'r') as config_file:
+                if config_file.read() == config_text:
+                    return False
+        except OSError:
+            pass
+        settings.write_atomic(path, config_text)
+        return True
+
+    def get_state(self, service):
+        return '1' if os.path.exists(self.path(service)) else '0'
+
+    def get_options(self, service):
+        options = self.read_file(self.path(service, enabled=False))
+        if options is None:
+            options = self.read_file(self.path(service))
+        return dict(options or {})
+
+    def get_option(self, service, option, default=None):
+        return self.get_options(service).get(option, default)
+
+    def set_option(self, service, option, value):
+        path = self.path(service)
+        options = dict(self.read_file(path) or {})
+        options[option] = value
+        return self.write_file(path, options)
+
+    def set_state(self, service, options, state):
+        """Enable the service with options or disable it, True if anything changed"""
+        enabled_path = self.path(service)
+        disabled_path = self.path(service, enabled=False)
+        if state == 1:
+            changed = False
+            if os.path.exists(disabled_path):
+                os.remove(disabled_path)
+                changed = True
+            return self.write_file(enabled_path, options) or changed
+        if os.path.exists(enabled_path):
+            os.replace(enabled_path, disabled_path)
+            return True
+        return False
+
+
+class ServicePlan(object):
+    """
+    Service states registered during startup, applied at once
+
+    Only the last state registered for a service is kept, pending() tells
+    it to readers until commit() writes the files of the services whose
+    configuration changed and returns these services.
+    """
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.lock = threading.Lock()
+        self.states = {}
+
+    def set_state(self, service, options, state):
+        with self.lock:
+            self.states[service] = (dict(options), state)
+
+    def pending(self, service):
+        """(options, state) registered for service and not written yet, or None"""
+        with self.lock:
+            return self.states.get(service)
+
+    def discard(self, service):
+        with self.lock:
+            self.states.pop(service, None)
+
+    def commit(self):
+        changed = []
+        with self.lock:
+            for service, (options, state) in self.states.items():
+                if self.configs.set_state(service, options, state):
+                    log.log(f'Service {service} changed', log.DEBUG)
+                    changed.append(service)
+            self.states = {}
+        return changed
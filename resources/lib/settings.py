@@ -0,0 +1,714 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import contextlib
+import copy
+import json
+import os
+import select
+import threading
+from xml.dom import minidom
+
+import inotify
+import log
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+WRITE_DELAY = 2
+POLL_INTERVAL = 5
+
+
+def fixed_writexml(self, writer, indent='', addindent='', newl=''):
+    writer.write(f'{indent}<{self.tagName}')
+    attrs = self._get_attributes()
+    a_names = list(attrs.keys())
+    a_names.sort()
+    for a_name in a_names:
+        writer.write(f' {a_name}="')
+        minidom._write_data(writer, attrs[a_name].value)
+        writer.write('"')
+    if self.childNodes:
+        if len(self.childNodes) == 1 and self.childNodes[0].nodeType == minidom.Node.TEXT_NODE:
+            writer.write('>')
+            self.childNodes[0].writexml(writer, '', '', '')
+            writer.write(f'</{self.tagName}>{newl}')
+            return
+        writer.write(f'>{newl}')
+        for node in self.childNodes:
+            if node.nodeType is not minidom.Node.TEXT_NODE:
+                node.writexml(writer, indent + addindent, addindent, newl)
+        writer.write(f'{indent}</{self.tagName}>{newl}')
+    else:
+        writer.write(f'/>{newl}')
+
+
+minidom.Element.writexml = fixed_writexml
+
+
+def parse_xml(config_text):
+    if config_text == '':
+        xml_conf = minidom.Document()
+        xml_main = xml_conf.createElement('libreelec')
+        xml_conf.appendChild(xml_main)
+        xml_sub = xml_conf.createElement('addon_config')
+        xml_main.appendChild(xml_sub)
+        xml_sub = xml_conf.createElement('settings')
+        xml_main.appendChild(xml_sub)
+    else:
+        xml_conf = minidom.parseString(config_text)
+    return xml_conf
+
+
+def child_elements(xml_node):
+    return [node for node in xml_node.childNodes if node.nodeType == minidom.Node.ELEMENT_NODE]
+
+
+def write_atomic(path, text):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as temp_file:
+        temp_file.write(text)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+    dir_fd = os.open(os.path.dirname(path) or '.', os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class XmlDocument(object):
+    """
+    Parsed oe_settings.xml
+
+    Elements are indexed as {main_node: {module: (element, {setting: element})}}
+    when the document is parsed and the index is kept up to date on changes,
+    so settings are looked up and updated without walking the tree.
+    """
+
+    extension = '.xml'
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.nodes = {}
+        self.values = {}
+        self.index()
+
+    @classmethod
+    def parse(cls, config_text):
+        return cls(parse_xml(config_text))
+
+    @classmethod
+    def from_xml(cls, xml_conf):
+        return cls(xml_conf)
+
+    def dump(self):
+        return self.xml.toprettyxml()
+
+    def to_xml(self):
+        return self.xml
+
+    def to_dict(self):
+        data = {}
+        for main_node, modules in self.nodes.items():
+            data[main_node] = {}
+            for module, (_, settings) in modules.items():
+                data[main_node][module] = {setting: getattr(xml_setting.firstChild, 'nodeValue', '') for setting, xml_setting in settings.items()}
+        return data
+
+    def copy(self):
+        return XmlDocument(self.xml.cloneNode(True))
+
+    def index(self):
+        self.nodes = {}
+        self.values = {}
+        for xml_main in child_elements(self.xml.documentElement):
+            modules = self.nodes.setdefault(xml_main.nodeName, {})
+            for xml_module in child_elements(xml_main):
+                _, settings = modules.setdefault(xml_module.nodeName, (xml_module, {}))
+                for xml_setting in child_elements(xml_module):
+                    settings[xml_setting.nodeName] = xml_setting
+                    if xml_main.nodeName == 'settings':
+                        self.index_value(xml_module.nodeName, xml_setting)
+
+    def index_value(self, module, xml_setting):
+        # an empty element reads back as missing once saved
+        value = getattr(xml_setting.firstChild, 'nodeValue', None)
+        if value:
+            self.values.setdefault(module, {})[xml_setting.nodeName] = value
+        else:
+            self.values.get(module, {}).pop(xml_setting.nodeName, None)
+
+    def get(self, module, setting, default=None):
+        return self.values.get(module, {}).get(setting, default)
+
+    def lookup(self, module, setting, main_node='settings'):
+        xml_setting = self.nodes.get(main_node, {}).get(module, (None, {}))[1].get(setting)
+        if xml_setting is None:
+            return None
+        return getattr(xml_setting.firstChild, 'nodeValue', '')
+
+    def get_module(self, module, main_node='settings'):
+        return self.nodes.get(main_node, {}).get(module, (None, None))[0]
+
+    def set(self, module, setting, value, main_node='settings'):
+        if main_node not in self.nodes:
+            xml_main = self.xml.createElement(main_node)
+            self.xml.documentElement.appendChild(xml_main)
+            self.nodes[main_node] = {}
+        modules = self.nodes[main_node]
+        if module not in modules:
+            xml_main = next(xml for xml in child_elements(self.xml.documentElement) if xml.nodeName == main_node)
+            xml_module = self.xml.createElement(module)
+            xml_main.appendChild(xml_module)
+            modules[module] = (xml_module, {})
+        xml_module, settings = modules[module]
+        xml_setting = settings.get(setting)
+        if xml_setting is None:
+            xml_setting = self.xml.createElement(setting)
+            xml_module.appendChild(xml_setting)
+            settings[setting] = xml_setting
+        if hasattr(xml_setting.firstChild, 'nodeValue'):
+            xml_setting.firstChild.nodeValue = value
+        else:
+            xml_setting.appendChild(self.xml.createTextNode(value))
+        if main_node == 'settings':
+            self.index_value(module, xml_setting)
+
+    def remove(self, module, setting, main_node='settings'):
+        xml_module, settings = self.nodes.get(main_node, {}).get(module, (None, {}))
+        xml_setting = settings.pop(setting, None)
+        if xml_setting is not None:
+            xml_module.removeChild(xml_setting)
+            if not settings:
+                xml_module.parentNode.removeChild(xml_module)
+                del self.nodes[main_node][module]
+        if main_node == 'settings':
+            self.values.get(module, {}).pop(setting, None)
+
+    def find(self, node_name):
+        if node_name in self.nodes:
+            return [xml for xml in child_elements(self.xml.documentElement) if xml.nodeName == node_name]
+        xml_nodes = [modules[node_name][0] for modules in self.nodes.values() if node_name in modules]
+        if xml_nodes:
+            return xml_nodes
+        return self.xml.getElementsByTagName(node_name)
+
+    def get_node(self, node_name):
+        value = {}
+        for xml_main_node in self.find(node_name):
+            value[xml_main_node.nodeName] = {}
+            for xml_sub_node in child_elements(xml_main_node):
+                if len(xml_sub_node.childNodes) == 0:
+                    continue
+                value[xml_main_node.nodeName][xml_sub_node.nodeName] = {}
+                for xml_value in child_elements(xml_sub_node):
+                    if hasattr(xml_value.firstChild, 'nodeValue'):
+                        value[xml_main_node.nodeName][xml_sub_node.nodeName][xml_value.nodeName] = xml_value.firstChild.nodeValue
+                    else:
+                        value[xml_main_node.nodeName][xml_sub_node.nodeName][xml_value.nodeName] = ''
+        return value
+
+    def remove_node(self, node_name):
+        for xml_main_node in self.find(node_name):
+            xml_main_node.parentNode.removeChild(xml_main_node)
+        self.index()
+
+
+class JsonDocument(object):
+    """
+    Settings stored as a JSON object {main_node: {module: {setting: value}}}
+
+    Offers the same interface as XmlDocument without keeping a DOM around.
+    """
+
+    extension = '.json'
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else {'addon_config': {}, 'settings': {}}
+
+    @classmethod
+    def parse(cls, config_text):
+        return cls(json.loads(config_text) if config_text else None)
+
+    @classmethod
+    def from_xml(cls, xml_conf):
+        return cls(XmlDocument(xml_conf).to_dict())
+
+    def dump(self):
+        return json.dumps(self.data, separators=(',', ':'))
+
+    def to_xml(self):
+        document = XmlDocument(parse_xml(''))
+        for main_node, modules in self.data.items():
+            for module, settings in modules.items():
+                for setting, value in settings.items():
+                    document.set(module, setting, value, main_node)
+        return document.xml
+
+    def to_dict(self):
+        return self.data
+
+    def copy(self):
+        return JsonDocument(copy.deepcopy(self.data))
+
+    def get(self, module, setting, default=None):
+        value = self.data.get('settings', {}).get(module, {}).get(setting)
+        return value if value else default
+
+    def lookup(self, module, setting, main_node='settings'):
+        return self.data.get(main_node, {}).get(module, {}).get(setting)
+
+    def get_module(self, module, main_node='settings'):
+        return self.data.get(main_node, {}).get(module)
+
+    def set(self, module, setting, value, main_node='settings'):
+        self.data.setdefault(main_node, {}).setdefault(module, {})[setting] = value
+
+    def remove(self, module, setting, main_node='settings'):
+        modules = self.data.get(main_node, {})
+        settings = modules.get(module, {})
+        if settings.pop(setting, None) is not None and not settings:
+            del modules[module]
+
+    def get_node(self, node_name):
+        value = {}
+        if node_name in self.data:
+            value[node_name] = {module: dict(settings) for module, settings in self.data[node_name].items() if settings}
+            return value
+        for modules in self.data.values():
+            if node_name in modules:
+                value[node_name] = {setting: {} for setting, setting_value in modules[node_name].items() if setting_value}
+        if value:
+            return value
+        for modules in self.data.values():
+            for settings in modules.values():
+                if node_name in settings:
+                    value[node_name] = {}
+        return value
+
+    def remove_node(self, node_name):
+        if node_name in self.data:
+            del self.data[node_name]
+            return
+        if any(node_name in modules for modules in self.data.values()):
+            for modules in self.data.values():
+                modules.pop(node_name, None)
+            return
+        for modules in self.data.values():
+            for module, settings in list(modules.items()):
+                settings.pop(node_name, None)
+
+
+BACKENDS = {
+    'xml': XmlDocument,
+    'json': JsonDocument,
+    }
+
+
+class ReadWriteLock(object):
+    """
+    Many readers or a single writer
+
+    Waiting writers are preferred over new readers, so a steady stream of
+    reads can not starve a write. The writer may re-acquire the lock for
+    reading or writing from the same thread. Waiters are woken as soon as
+    the lock is released.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.depth = 0
+        self.waiting = 0
+
+    def is_writer(self):
+        return self.writer == threading.get_ident()
+
+    def acquire_read(self):
+        with self.condition:
+            if self.writer == threading.get_ident():
+                self.depth += 1
+                return
+            while self.writer is not None or self.waiting:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            if self.writer == threading.get_ident():
+                self.depth -= 1
+                return
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        ident = threading.get_ident()
+        with self.condition:
+            if self.writer == ident:
+                self.depth += 1
+                return
+            self.waiting += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+            finally:
+                self.waiting -= 1
+            self.writer = ident
+            self.depth = 1
+
+    def release_write(self):
+        with self.condition:
+            self.depth -= 1
+            if self.depth == 0:
+                self.writer = None
+                self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class Settings(object):
+    """
+    Process wide cache of the settings file
+
+    The document class given as backend defines the file format, see
+    BACKENDS. If the file does not exist yet, the settings are migrated from
+    legacy_path, the former oe_settings.xml. The file is parsed once and kept
+    in memory until its inode, mtime or size changes on disk.
+
+    With a write delay, saved changes are only applied in memory and written
+    out by flush() once no further change arrived for delay seconds. Pending
+    changes take precedence over the file on disk until they are flushed.
+
+    Changes are made in transactions which hold the lock exclusively and
+    keep the previous value of every setting they touch, so that they are
+    rolled back when the transaction fails and saved once when it succeeds.
+
+    Reads share a reader/writer lock, changes and reloads hold it exclusively.
+    With file_lock, the file is also locked with flock() on a sidecar lock
+    file while it is read or replaced, shared or exclusive respectively.
+
+    Callbacks subscribed to a setting are called with module, setting and
+    the new value whenever the value changes, be it in this process or by
+    another one. The directory of the file is watched with inotify for the
+    latter, or polled every POLL_INTERVAL seconds if inotify is unavailable.
+    Callbacks run without any lock held, from the thread that made or
+    noticed the change.
+    """
+
+    def __init__(self, path, delay=0, file_lock=False, backend=XmlDocument, legacy_path=None):
+        self.path = path
+        self.backend = backend
+        self.legacy_path = legacy_path if legacy_path != path else None
+        self.delay = delay
+        self.lock_path = f'{path}.lock' if file_lock and fcntl else None
+        self.lock = ReadWriteLock()
+        self.stamp = None
+        self.document = None
+        self.dirty = False
+        self.timer = None
+        self.closed = False
+        self.undo = None
+        self.snapshot = None
+        self.subscribers = {}
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.watcher = None
+        self.stopping = threading.Event()
+        self.wakeup = None
+
+    def get_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @contextlib.contextmanager
+    def file_lock(self, exclusive):
+        if self.lock_path is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_current(self):
+        if self.document is None:
+            return False
+        if self.dirty or self.undo is not None:
+            return True
+        return self.get_stamp() == self.stamp
+
+    def reload(self):
+        # the write lock must be held
+        if self.is_current():
+            return self.document
+        values = self.watched_values()
+        config_text = ''
+        with self.file_lock(False):
+            stamp = self.get_stamp()
+            if stamp is not None:
+                with open(self.path, 'r') as config_file:
+                    config_text = config_file.read()
+        if stamp is None and self.legacy_path is not None and os.path.exists(self.legacy_path):
+            self.migrate()
+        else:
+            self.document = self.backend.parse(config_text)
+            self.stamp = stamp
+        self.queue_changes(values)
+        return self.document
+
+    def migrate(self):
+        # the write lock must be held
+        with open(self.legacy_path, 'r') as config_file:
+            config_text = config_file.read()
+        self.document = self.backend.from_xml(parse_xml(config_text))
+        self.stamp = None
+        log.log(f'Migrating {self.legacy_path} to {self.path}', log.INFO)
+        self.changed()
+
+    @contextlib.contextmanager
+    def reading(self):
+        with self.lock.read():
+            if self.is_current():
+                yield self.document
+                return
+        with self.lock.write():
+            yield self.reload()
+        self.dispatch()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock.write():
+            document = self.reload()
+            if self.undo is not None:
+                # nested transactions are part of the outer one
+                yield document
+                return
+            values = self.watched_values()
+            self.undo = {}
+            self.snapshot = None
+            try:
+                yield document
+            except BaseException:
+                self.rollback()
+                raise
+            else:
+                if self.undo or self.snapshot is not None:
+                    self.queue_changes(values)
+                    self.changed()
+            finally:
+                self.undo = None
+                self.snapshot = None
+        self.dispatch()
+
+    def rollback(self):
+        # the write lock must be held
+        undo = self.undo
+        if self.snapshot is not None:
+            self.document, undo = self.snapshot
+        for (main_node, module, setting), value in undo.items():
+            if value is None:
+                self.document.remove(module, setting, main_node)
+            else:
+                self.document.set(module, setting, value, main_node)
+
+    def load(self):
+        with self.reading() as document:
+            return document
+
+    def load_xml(self):
+        """Copy of the settings as a DOM, which may be changed and passed to save()"""
+        with self.reading() as document:
+            return document.to_xml().cloneNode(True)
+
+    def save(self, xml_conf):
+        with self.lock.write():
+            values = self.watched_values()
+            self.document = self.backend.from_xml(xml_conf)
+            self.queue_changes(values)
+            self.changed()
+        self.dispatch()
+
+    def changed(self):
+        # the write lock must be held
+        self.dirty = True
+        if not self.delay or self.closed:
+            # nothing would flush a delayed write after close()
+            self.write_file()
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(self.delay, self.on_timer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        with self.lock.write():
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.dirty:
+                self.write_file()
+
+    def on_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            log.log(f'Failed to write {self.path}: {repr(e)}', log.ERROR)
+
+    def write_file(self):
+        # the write lock must be held
+        config_text = self.document.dump()
+        with self.file_lock(True):
+            write_atomic(self.path, config_text)
+            self.stamp = self.get_stamp()
+        self.dirty = False
+
+    def export_xml(self, path):
+        with self.reading() as document:
+            config_text = document.to_xml().toprettyxml()
+        write_atomic(path, config_text)
+
+    def read(self, module, setting, default=None):
+        with self.reading() as document:
+            return document.get(module, setting, default)
+
+    def read_module(self, module):
+        with self.reading() as document:
+            return document.get_module(module)
+
+    def read_node(self, node_name):
+        with self.reading() as document:
+            return document.get_node(node_name)
+
+    def write(self, module, setting, value, main_node='settings'):
+        with self.transaction() as document:
+            key = (main_node, module, setting)
+            if key not in self.undo:
+                self.undo[key] = document.lookup(module, setting, main_node)
+            document.set(module, setting, value, main_node)
+
+    def write_settings(self, module, values, main_node='settings'):
+        with self.transaction():
+            for setting, value in values.items():
+                self.write(module, setting, value, main_node)
+
+    def remove_node(self, node_name):
+        with self.transaction() as document:
+            if self.snapshot is None:
+                self.snapshot = (document.copy(), dict(self.undo))
+            document.remove_node(node_name)
+
+    def watched_values(self):
+        # the write lock must be held
+        if self.document is None:
+            return dict.fromkeys(self.subscribers)
+        return {key: self.document.lookup(key[1], key[2], key[0]) or None for key in self.subscribers}
+
+    def queue_changes(self, values):
+        # the write lock must be held
+        for key, value in self.watched_values().items():
+            if value != values.get(key):
+                with self.pending_lock:
+                    self.pending.append((key, value))
+
+    def dispatch(self):
+        if self.lock.is_writer():
+            # called again once the outermost holder releases the lock
+            return
+        with self.pending_lock:
+            pending, self.pending = self.pending, []
+        for (main_node, module, setting), value in pending:
+            for callback in list(self.subscribers.get((main_node, module, setting), ())):
+                try:
+                    callback(module, setting, value)
+                except Exception as e:
+                    log.log(f'Settings callback {repr(callback)} failed: {repr(e)}', log.ERROR)
+
+    def subscribe(self, module, setting, callback, main_node='settings'):
+        with self.lock.write():
+            self.reload()
+            self.subscribers.setdefault((main_node, module, setting), []).append(callback)
+            if self.watcher is None:
+                self.wakeup = os.pipe()
+                self.watcher = threading.Thread(target=self.watch, daemon=True)
+                self.watcher.start()
+        self.dispatch()
+
+    def unsubscribe(self, module, setting, callback, main_node='settings'):
+        with self.lock.write():
+            callbacks = self.subscribers.get((main_node, module, setting), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.subscribers.pop((main_node, module, setting), None)
+
+    def refresh(self):
+        with self.lock.write():
+            self.reload()
+        self.dispatch()
+
+    def watch(self):
+        try:
+            notifier = inotify.Inotify()
+            notifier.add_watch(os.path.dirname(self.path) or '.', inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO)
+        except (AttributeError, OSError) as e:
+            log.log(f'Polling {self.path}, inotify is unavailable: {repr(e)}', log.INFO)
+            notifier = None
+        name = os.path.basename(self.path)
+        try:
+            while not self.stopping.is_set():
+                if notifier is None:
+                    if self.stopping.wait(POLL_INTERVAL):
+                        break
+                else:
+                    readable, _, _ = select.select([notifier, self.wakeup[0]], [], [])
+                    if self.wakeup[0] in readable:
+                        break
+                    events = notifier.read()
+                    if not any(event_name == name or mask & inotify.IN_Q_OVERFLOW for _, mask, event_name in events):
+                        continue
+                try:
+                    self.refresh()
+                except Exception as e:
+                    log.log(f'Failed to reload {self.path}: {repr(e)}', log.ERROR)
+        finally:
+            if notifier is not None:
+                notifier.close()
+
+    def close(self):
+        with self.lock.write():
+            self.closed = True
+        self.flush()
+        self.stopping.set()
+        if self.watcher is not None:
+            os.write(self.wakeup[1], b'\0')
+            self.watcher.join()
+            for fd in self.wakeup:
+                os.close(fd)
+            self.watcher = None
+            self.wakeup = None
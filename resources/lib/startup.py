@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+import log
+
+POOL_SIZE = 4
+THREAD_NAME_PREFIX = 'startup'
+TIMEOUT = 30
+
+Timing = collections.namedtuple('Timing', ['name', 'start', 'duration', 'status'])
+
+
+def start_modules(modules, timeout=TIMEOUT):
+    """
+    Call start_service of the modules, concurrently where possible
+
+    modules is {name: module} in the preferred start order. A module starts
+    once every module named in its START_AFTER has finished, failed or
+    timed out. Modules still running after timeout seconds are reported as
+    timed out and no longer waited for. Returns a Timing per module, with
+    times in seconds relative to the start of the scheduler.
+    """
+    origin = time.monotonic()
+    pending = list(modules)
+    running = {}
+    timings = {}
+
+    def finish(name, status):
+        future, started = running.pop(name)
+        timings[name] = Timing(name, started - origin, time.monotonic() - started, status)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix=THREAD_NAME_PREFIX)
+    try:
+        while pending or running:
+            ready = [name for name in pending
+                     if all(dependency in timings or dependency not in modules
+                            for dependency in getattr(modules[name], 'START_AFTER', ()))]
+            if not ready and not running:
+                log.log(f'Circular START_AFTER between {pending}, starting them in order', log.WARNING)
+                ready = pending[:1]
+            for name in ready:
+                pending.remove(name)
+                running[name] = (executor.submit(modules[name].start_service), time.monotonic())
+            deadline = min(started for future, started in running.values()) + timeout
+            done, not_done = concurrent.futures.wait(
+                [future for future, started in running.values()],
+                timeout=max(deadline - time.monotonic(), 0),
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            now = time.monotonic()
+            for name, (future, started) in list(running.items()):
+                if future in done:
+                    if future.exception() is not None:
+                        log.log(f'{name} failed to start: {repr(future.exception())}', log.ERROR)
+                        finish(name, 'failed')
+                    else:
+                        finish(name, 'done')
+                elif now - started >= timeout:
+                    log.log(f'{name} did not start within {timeout}s', log.WARNING)
+                    finish(name, 'timeout')
+    finally:
+        executor.shutdown(wait=False)
+    report = [timings[name] for name in modules]
+    for timing in report:
+        log.log(f'{timing.name}: {timing.status} in {timing.duration:.3f}s, started at +{timing.start:.3f}s', log.INFO)
+    return report
+
+
+def in_startup_thread():
+    """True when called from start_service of a module, even after it timed out"""
+    return threading.current_thread().name.startswith(f'{THREAD_NAME_PREFIX}_')
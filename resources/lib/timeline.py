@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+import log
+import settings
+
+# a phase is a regression if it takes this many seconds and times longer
+REGRESSION_SECONDS = 0.25
+REGRESSION_RATIO = 1.5
+
+
+class Timeline(object):
+    """
+    Start offset and duration of the startup phases of the service
+
+    Times are monotonic, in seconds since the timeline was created, which
+    is when service.py starts importing its modules. Phases may nest and
+    may be recorded from several threads.
+    """
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.lock = threading.Lock()
+        self.phases = []
+        self.last_mark = self.origin
+
+    def add(self, name, start, duration):
+        with self.lock:
+            self.phases.append((name, round(start - self.origin, 4), round(duration, 4)))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.monotonic() - start)
+
+    def mark(self, name):
+        """Phase from the previous mark, or the creation of the timeline, until now"""
+        now = time.monotonic()
+        with self.lock:
+            start, self.last_mark = self.last_mark, now
+        self.add(name, start, now - start)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'ready': round(time.monotonic() - self.origin, 4),
+                'phases': [list(phase) for phase in sorted(self.phases, key=lambda phase: phase[1])],
+                }
+
+    def format(self):
+        timeline = self.to_dict()
+        lines = [f'{start:8.3f} {duration:8.3f} {name}' for name, start, duration in timeline['phases']]
+        lines.append(f'{timeline["ready"]:8.3f} {"":8} ready')
+        return '\n'.join(lines)
+
+    def finish(self, path):
+        """Log the timeline, compare it to the previous boot and save it"""
+        timeline = self.to_dict()
+        log.log(f'Startup timeline (start, duration, phase):\n{self.format()}', log.INFO)
+        previous = load(path)
+        if previous is not None:
+            for name, before, after in compare(previous, timeline):
+                log.log(f'Startup regression in {name}: {before:.3f}s -> {after:.3f}s', log.WARNING)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if previous is not None:
+                os.replace(path, previous_path(path))
+            settings.write_atomic(path, json.dumps(timeline))
+        except OSError as e:
+            log.log(f'Failed to write {path}: {repr(e)}', log.ERROR)
+        return timeline
+
+
+def previous_path(path):
+    base, extension = os.path.splitext(path)
+    return f'{base}.previous{extension}'
+
+
+def load(path):
+    try:
+        with open(path) as timeline_file:
+            return json.load(timeline_file)
+    except (OSError, ValueError):
+        return None
+
+
+def durations(timeline):
+    result = {}
+    for name, start, duration in timeline.get('phases', []):
+        result[name] = result.get(name, 0) + duration
+    result['ready'] = timeline.get('ready', 0)
+    return result
+
+
+def compare(previous, current, seconds=REGRESSION_SECONDS, ratio=REGRESSION_RATIO):
+    """Phases of current that took at least seconds longer and ratio times longer than in previous"""
+    before = durations(previous)
+    regressions = []
+    for name, after in durations(current).items():
+        if name in before and after - before[name] >= seconds and after >= before[name] * ratio:
+            regressions.append((name, before[name], after))
+    return regressions
+
+
+TIMELINE = Timeline()
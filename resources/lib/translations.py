@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+import array
+import ast
+import bisect
+import mmap
+import os
+import struct
+
+import log
+
+# magic, version, number of strings, size and mtime of the source catalog
+HEADER = struct.Struct('=IIIQQ')
+MAGIC = 0x4C45504F
+VERSION = 1
+
+
+def catalog_path(addon_path, language):
+    return os.path.join(addon_path, 'resources', 'language', language, 'strings.po')
+
+
+def unquote(line):
+    # a po string is a C string literal, which Python parses just the same
+    return ast.literal_eval(line)
+
+
+def parse_po(lines):
+    """Return {code: msgstr} of the translated entries with a "#code" msgctxt"""
+    strings = {}
+    entry = {}
+    keyword = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('"') and keyword is not None:
+            entry[keyword] += unquote(line)
+            continue
+        if not line or line.startswith('#'):
+            continue
+        keyword, _, value = line.partition(' ')
+        if keyword in ('msgctxt', 'msgid') and 'msgstr' in entry:
+            add_entry(strings, entry)
+            entry = {}
+        entry[keyword] = unquote(value)
+    add_entry(strings, entry)
+    return strings
+
+
+def add_entry(strings, entry):
+    context = entry.get('msgctxt', '')
+    if context.startswith('#') and context[1:].isdigit() and entry.get('msgstr'):
+        strings[int(context[1:])] = entry['msgstr']
+
+
+def read_catalog(path):
+    with open(path, encoding='utf-8') as po_file:
+        return parse_po(po_file)
+
+
+def load_catalog(path):
+    try:
+        return read_catalog(path)
+    except (OSError, SyntaxError, ValueError) as e:
+        log.log(f'Failed to load {path}: {repr(e)}', log.ERROR)
+        return {}
+
+
+class CompiledCatalog(object):
+    """
+    Memory mapped catalog compiled by compile_catalog()
+
+    The file holds the header, the sorted codes as uint32, one uint32 offset
+    per string plus the end offset, and the UTF-8 strings. Strings are looked
+    up by bisecting the codes and decoded on access, so nothing but the
+    mapping is kept in memory.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as catalog_file:
+            self.map = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.source_size, self.source_mtime = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a compiled catalog')
+        view = memoryview(self.map)
+        start = HEADER.size
+        self.codes = view[start:start + 4 * count].cast('I')
+        start += 4 * count
+        self.offsets = view[start:start + 4 * (count + 1)].cast('I')
+        self.strings = start + 4 * (count + 1)
+
+    def get(self, code, default=None):
+        index = bisect.bisect_left(self.codes, code)
+        if index == len(self.codes) or self.codes[index] != code:
+            return default
+        return self.map[self.strings + self.offsets[index]:self.strings + self.offsets[index + 1]].decode('utf-8')
+
+
+def compile_catalog(source_path, path):
+    # raises if strings.po can not be parsed, rather than caching an empty catalog
+    stat = os.stat(source_path)
+    strings = read_catalog(source_path)
+    codes = array.array('I', sorted(strings))
+    offsets = array.array('I', [0])
+    blob = bytearray()
+    for code in codes:
+        blob += strings[code].encode('utf-8')
+        offsets.append(len(blob))
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as catalog_file:
+        catalog_file.write(HEADER.pack(MAGIC, VERSION, len(codes), stat.st_size, stat.st_mtime_ns))
+        catalog_file.write(codes.tobytes())
+        catalog_file.write(offsets.tobytes())
+        catalog_file.write(blob)
+    os.replace(temp_path, path)
+
+
+def open_catalog(addon_path, language, cache_dir):
+    """
+    Return the compiled catalog of language, compiled into cache_dir first
+    if it is missing or older than strings.po. Falls back to a dict if the
+    catalog can not be compiled.
+    """
+    source_path = catalog_path(addon_path, language)
+    path = os.path.join(cache_dir, f'{language}.bin')
+    try:
+        stat = os.stat(source_path)
+        try:
+            catalog = CompiledCatalog(path)
+            if (catalog.source_size, catalog.source_mtime) == (stat.st_size, stat.st_mtime_ns):
+                return catalog
+        except (OSError, ValueError, struct.error):
+            pass
+        os.makedirs(cache_dir, exist_ok=True)
+        compile_catalog(source_path, path)
+        return CompiledCatalog(path)
+    except (OSError, SyntaxError, ValueError, struct.error) as e:
+        log.log(f'Failed to compile {source_path}: {repr(e)}', log.ERROR)
+        return load_catalog(source_path)
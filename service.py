@@ -4,8 +4,11 @@
 # Copyright (C) 2019-present Team LibreELEC (https://libreelec.tv)
 
 import syspath
+import timeline
 import dbus_utils
+timeline.TIMELINE.mark('import dbus_utils')
 import oe
+timeline.TIMELINE.mark('import oe')
 import os
 import log
 import threading
@@ -43,12 +46,8 @@ class Service_Thread(threading.Thread):
             conn.close()
             log.log(f'Received {message}', log.INFO)
             if message == 'openConfigurationWindow':
-                if not hasattr(oe, 'winOeMain'):
+                if not oe.window_visible():
                     threading.Thread(target=oe.openConfigurationWindow).start()
-                else:
-                    if oe.winOeMain.visible != True:
-                        threading.Thread(
-                            target=oe.openConfigurationWindow).start()
             if message == 'exit':
                 self.stopped = True
 
@@ -64,29 +63,44 @@ class Service_Thread(threading.Thread):
 
 class Monitor(xbmc.Monitor):
 
+    def __init__(self):
+        xbmc.Monitor.__init__(self)
+        self.bluetooth = {}
+        for setting in ('standby', 'idle_timeout'):
+            oe.subscribe('bluetooth', setting, self.on_setting_changed)
+            self.bluetooth[setting] = oe.read_setting('bluetooth', setting)
+
+    @log.log_function()
+    def on_setting_changed(self, module, setting, value):
+        self.bluetooth[setting] = value
+
     @log.log_function()
     def onScreensaverActivated(self):
-        if oe.read_setting('bluetooth', 'standby'):
+        if self.bluetooth['standby']:
             threading.Thread(target=oe.standby_devices).start()
 
     @log.log_function()
     def onDPMSActivated(self):
-        if oe.read_setting('bluetooth', 'standby'):
+        if self.bluetooth['standby']:
             threading.Thread(target=oe.standby_devices).start()
 
     @log.log_function()
     def run(self):
         dbus_utils.LOOP_THREAD.start()
         oe.load_modules()
+        timeline.TIMELINE.mark('load_modules')
         oe.start_service()
+        timeline.TIMELINE.mark('start_service')
         service_thread = Service_Thread()
         service_thread.start()
+        timeline.TIMELINE.finish(f'{oe.CONFIG_CACHE}/libreelec/startup.json')
+        oe.prewarm_main_window()
         while not self.abortRequested():
             if self.waitForAbort(60):
                 break
-            if not oe.read_setting('bluetooth', 'standby'):
+            if not self.bluetooth['standby']:
                 continue
-            timeout = oe.read_setting('bluetooth', 'idle_timeout')
+            timeout = self.bluetooth['idle_timeout']
             if not timeout:
                 continue
             try:
@@ -98,9 +112,8 @@ class Monitor(xbmc.Monitor):
             if xbmc.getGlobalIdleTime() / 60 >= timeout:
                 log.log(f'Idle timeout reached', log.DEBUG)
                 oe.standby_devices()
-        if hasattr(oe, 'winOeMain') and hasattr(oe.winOeMain, 'visible'):
-            if oe.winOeMain.visible == True:
-                oe.winOeMain.close()
+        if oe.window_visible():
+            oe.winOeMain.close()
         oe.stop_service()
         service_thread.stop()
         dbus_utils.LOOP_THREAD.stop()
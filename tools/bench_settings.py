@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+"""
+Benchmark of the settings store (resources/lib/settings.py)
+
+Runs outside of Kodi, the xbmc module is replaced by a stub if it is not
+installed. Settings files with the requested number of keys are generated
+in a temporary directory for every backend and the cost of the operations
+behind oe.load_config/read_setting/write_setting/read_node is reported as
+latency percentiles, together with parse time, peak memory and the number
+of bytes written to disk.
+
+The menu mode replays the settings reads of opening the main window: the
+values read by each module's load_values and two reads per translated
+label as done by oe._().
+
+    tools/bench_settings.py --keys 10,100,1000,10000 --backend xml,json
+    tools/bench_settings.py --mode menu --keys 1000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import kodi_stub
+
+kodi_stub.stub_kodi()
+sys.path.insert(0, os.path.join(kodi_stub.ROOT, 'resources', 'lib'))
+import settings
+
+# module, setting pairs read by load_values when the main window opens
+MENU_READS = [
+    ('system', 'KeyboardType'),
+    ('system', 'KeyboardLayout1'),
+    ('system', 'KeyboardVariant1'),
+    ('system', 'KeyboardLayout2'),
+    ('system', 'KeyboardVariant2'),
+    ('system', 'pinlock_enable'),
+    ('system', 'pinlock_pin'),
+    ('system', 'pinlock_numFail'),
+    ('system', 'pinlock_timeFail'),
+    ('system', 'journal_persistent'),
+    ('system', 'journal_size'),
+    ('system', 'journal_rate_limit'),
+    ('updates', 'AutoUpdate'),
+    ('updates', 'SubmitStats'),
+    ('updates', 'UpdateNotify'),
+    ('updates', 'Channel'),
+    ('updates', 'ShowCustomChannels'),
+    ('updates', 'CustomChannel1'),
+    ('updates', 'CustomChannel2'),
+    ('updates', 'CustomChannel3'),
+    ('bluetooth', 'idle_timeout'),
+    ('bluetooth', 'idle_timeout'),
+    ('bluetooth', 'standby'),
+    ]
+# translated labels of the main window and the module menus
+MENU_LABELS = 160
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+        self.write_atomic = settings.write_atomic
+        settings.write_atomic = self
+
+    def __call__(self, path, text):
+        self.writes += 1
+        self.bytes += len(text.encode('utf-8'))
+        self.write_atomic(path, text)
+
+    def reset(self):
+        self.writes = 0
+        self.bytes = 0
+
+
+def generate(keys, modules):
+    data = {'addon_config': {}, 'settings': {}}
+    for module, setting in MENU_READS:
+        data['settings'].setdefault(module, {})[setting] = '1'
+    for key in range(max(keys - len(MENU_READS), 0)):
+        module = f'module{key % modules}'
+        data['settings'].setdefault(module, {})[f'setting{key}'] = f'value{key}'
+    return data
+
+
+def write_file(directory, backend, data):
+    path = os.path.join(directory, f'oe_settings{backend.extension}')
+    document = settings.JsonDocument(data)
+    if backend is settings.XmlDocument:
+        config_text = document.to_xml().toprettyxml()
+    else:
+        config_text = document.dump()
+    with open(path, 'w') as config_file:
+        config_file.write(config_text)
+    return path, config_text
+
+
+def invalidate(path):
+    # a new mtime makes the store reparse the file on the next access
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+
+def measure(function, iterations, setup=None):
+    samples = []
+    for iteration in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function(iteration)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda fraction: samples[min(int(len(samples) * fraction), len(samples) - 1)]
+    return {
+        'p50': statistics.median(samples),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': samples[-1],
+        }
+
+
+def print_row(name, samples, extra=''):
+    values = percentiles(samples)
+    print(f'  {name:<24}' + ''.join(f'{values[key] * 1e6:>12.1f}' for key in ('p50', 'p90', 'p99', 'max')) + f'  {extra}')
+
+
+def print_header(title):
+    print(title)
+    print(f'  {"operation (us)":<24}' + ''.join(f'{key:>12}' for key in ('p50', 'p90', 'p99', 'max')))
+
+
+def bench_parse(backend, config_text, iterations):
+    samples = measure(lambda _: backend.parse(config_text), iterations)
+    tracemalloc.start()
+    document = backend.parse(config_text)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del document
+    return samples, current, peak
+
+
+def bench_operations(path, backend, data, iterations, counter):
+    store = settings.Settings(path, backend=backend)
+    modules = [module for module in data['settings'] if data['settings'][module]]
+    keys = [(module, setting) for module in modules for setting in data['settings'][module]]
+    key = lambda iteration: keys[iteration * 7919 % len(keys)]
+    module = lambda iteration: modules[iteration * 31 % len(modules)]
+
+    results = []
+    results.append(('load_config (cold)', measure(lambda _: store.load_xml(), iterations, lambda: invalidate(path)), ''))
+    results.append(('read_setting (cold)', measure(lambda i: store.read(*key(i)), iterations, lambda: invalidate(path)), ''))
+    results.append(('read_setting', measure(lambda i: store.read(*key(i)), iterations * 10), ''))
+    results.append(('read_setting (missing)', measure(lambda i: store.read(module(i), 'missing'), iterations * 10), ''))
+    results.append(('read_node (module)', measure(lambda i: store.read_node(module(i)), iterations), ''))
+    results.append(('read_node (settings)', measure(lambda _: store.read_node('settings'), iterations), ''))
+    counter.reset()
+    samples = measure(lambda i: store.write(*key(i), f'new{i}'), iterations)
+    results.append(('write_setting', samples, f'{counter.bytes / counter.writes / 1024:.1f} KiB/write'))
+
+    delayed = settings.Settings(path, delay=3600, backend=backend)
+    counter.reset()
+    samples = measure(lambda i: delayed.write(*key(i), f'delayed{i}'), iterations)
+    delayed.flush()
+    results.append(('write_setting (delayed)', samples, f'{counter.bytes / 1024:.1f} KiB in {counter.writes} writes'))
+    counter.reset()
+    samples = measure(lambda i: store.write_settings(module(i), {setting: f'batch{i}' for setting in data['settings'][module(i)]}), iterations)
+    results.append(('write_settings (module)', samples, f'{counter.bytes / counter.writes / 1024:.1f} KiB/write'))
+    return results
+
+
+def replay_menu(path, backend, iterations):
+    store = settings.Settings(path, backend=backend)
+
+    def open_menu(_):
+        for module, setting in MENU_READS:
+            store.read(module, setting)
+        for label in range(MENU_LABELS):
+            store.read('libreelec', 'wizard_completed')
+            store.read('system', 'language')
+
+    return [
+        ('menu open (cold)', measure(open_menu, iterations, lambda: invalidate(path)), ''),
+        ('menu open (warm)', measure(open_menu, iterations), ''),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the settings store')
+    parser.add_argument('--keys', default='10,100,1000,10000', help='comma separated number of settings')
+    parser.add_argument('--modules', type=int, default=50, help='number of modules the settings are spread over')
+    parser.add_argument('--backend', default=','.join(settings.BACKENDS), help='comma separated backends')
+    parser.add_argument('--iterations', type=int, default=50, help='samples per operation')
+    parser.add_argument('--mode', choices=('ops', 'menu', 'all'), default='all')
+    args = parser.parse_args()
+
+    counter = Counter()
+    with tempfile.TemporaryDirectory() as directory:
+        for keys in [int(keys) for keys in args.keys.split(',')]:
+            data = generate(keys, args.modules)
+            for name in args.backend.split(','):
+                backend = settings.BACKENDS[name]
+                path, config_text = write_file(directory, backend, data)
+                samples, current, peak = bench_parse(backend, config_text, args.iterations)
+                print_header(f'{name}, {keys} keys, {args.modules} modules, {len(config_text) / 1024:.1f} KiB on disk')
+                print_row('parse', samples, f'{current / 1024:.0f} KiB retained, {peak / 1024:.0f} KiB peak')
+                results = []
+                if args.mode in ('ops', 'all'):
+                    results.extend(bench_operations(path, backend, data, args.iterations, counter))
+                if args.mode in ('menu', 'all'):
+                    results.extend(replay_menu(path, backend, args.iterations))
+                for operation, samples, extra in results:
+                    print_row(operation, samples, extra)
+                print()
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
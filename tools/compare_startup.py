@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+"""
+Compare two startup timelines written by the settings service
+
+The service writes the timeline of the current boot to
+$CONFIG_CACHE/libreelec/startup.json and keeps the one of the boot before
+as startup.previous.json, these are compared if no files are given. All
+phases are listed with their durations, regressions are marked with '!'.
+
+    tools/compare_startup.py
+    tools/compare_startup.py old.json new.json --seconds 0.1 --ratio 1.2
+"""
+
+import argparse
+import os
+import sys
+
+import kodi_stub
+
+kodi_stub.stub_kodi()
+sys.path.insert(0, os.path.join(kodi_stub.ROOT, 'resources', 'lib'))
+import timeline
+
+
+def main():
+    current = os.path.join(os.environ.get('CONFIG_CACHE', '/storage/.cache'), 'libreelec', 'startup.json')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('previous', nargs='?', default=timeline.previous_path(current))
+    parser.add_argument('current', nargs='?', default=current)
+    parser.add_argument('--seconds', type=float, default=timeline.REGRESSION_SECONDS)
+    parser.add_argument('--ratio', type=float, default=timeline.REGRESSION_RATIO)
+    args = parser.parse_args()
+
+    timelines = [timeline.load(path) for path in (args.previous, args.current)]
+    for path, loaded in zip((args.previous, args.current), timelines):
+        if loaded is None:
+            sys.exit(f'Cannot read {path}')
+    before, after = (timeline.durations(loaded) for loaded in timelines)
+    regressions = {name for name, _, _ in timeline.compare(*timelines, seconds=args.seconds, ratio=args.ratio)}
+    print(f'  {"phase":40} {"before":>8} {"after":>8}')
+    for name in sorted(set(before) | set(after), key=lambda name: (name == 'ready', name)):
+        flag = '!' if name in regressions else ' '
+        values = [f'{durations[name]:8.3f}' if name in durations else f'{"-":>8}' for durations in (before, after)]
+        print(f'{flag} {name:40} {values[0]} {values[1]}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,21 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2020-present Team LibreELEC
+
+"""Helpers for the scripts in tools, which import the add-on outside of Kodi"""
+
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stub_kodi():
+    """Replace the xbmc module by a stub that drops log messages, if it is not installed"""
+    try:
+        import xbmc
+    except ImportError:
+        xbmc = types.ModuleType('xbmc')
+        xbmc.LOGDEBUG, xbmc.LOGINFO, xbmc.LOGWARNING, xbmc.LOGERROR, xbmc.LOGFATAL = range(5)
+        xbmc.log = lambda message, level=xbmc.LOGDEBUG: None
+        sys.modules['xbmc'] = xbmc